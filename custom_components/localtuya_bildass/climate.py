@@ -500,7 +500,7 @@ class LocaltuyaClimate(LocalTuyaEntity, ClimateEntity):
                     break
             else:
                 # in case fan mode and preset share the same dp
-                _LOGGER.debug("Unknown fan mode %s" % self.dps_conf(CONF_HVAC_FAN_MODE_DP))
+                _LOGGER.debug("Unknown fan mode %s", self.dps_conf(CONF_HVAC_FAN_MODE_DP))
                 self._fan_mode = FAN_AUTO
 
         # Update the swing status
@@ -510,7 +510,7 @@ class LocaltuyaClimate(LocalTuyaEntity, ClimateEntity):
                     self._swing_mode = mode
                     break
             else:
-                _LOGGER.debug("Unknown swing mode %s" % self.dps_conf(CONF_HVAC_SWING_MODE_DP))
+                _LOGGER.debug("Unknown swing mode %s", self.dps_conf(CONF_HVAC_SWING_MODE_DP))
                 self._swing_mode = SWING_OFF
 
         # Update the current action
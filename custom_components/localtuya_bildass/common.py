@@ -131,7 +131,7 @@ def async_config_entry_by_device_id(hass, device_id):
         if device_id in entry.data.get(CONF_DEVICES, []):
             return entry
         else:
-            _LOGGER.debug(f"Missing device configuration for device_id {device_id}")
+            _LOGGER.debug("Missing device configuration for device_id %s", device_id)
     return None
 
 
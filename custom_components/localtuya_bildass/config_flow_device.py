@@ -469,7 +469,7 @@ class DeviceOperationsMixin:
                         CONF_PLATFORM: entity_def["platform"],
                     }
                     for key, value in entity_def.items():
-                        if key not in ["id", "friendly_name", "platform"]:
+                        if key not in {"id", "friendly_name", "platform"}:
                             entity[key] = value
                     self.entities.append(entity)
 
@@ -1,4 +1,5 @@
 """Helper functions and schemas for LocalTuya 2.0 config flow."""
+import copy
 import logging
 from importlib import import_module
 
@@ -184,9 +185,13 @@ def options_schema(entities):
 
 
 def schema_defaults(schema, dps_list=None, **defaults):
-    """Create a new schema with default values filled in."""
-    copy = schema.extend({})
-    for field, field_type in copy.schema.items():
+    """Create a new schema with default values filled in.
+
+    Markers are copied before a default is set, so shared module-level
+    schemas are never modified.
+    """
+    fields = {}
+    for field, field_type in schema.schema.items():
         if isinstance(field_type, vol.In):
             value = None
             for dps in dps_list or []:
@@ -195,12 +200,20 @@ def schema_defaults(schema, dps_list=None, **defaults):
                     break
 
             if value in field_type.container:
-                field.default = vol.default_factory(value)
+                fields[_with_default(field, value)] = field_type
                 continue
 
         if field.schema in defaults:
-            field.default = vol.default_factory(defaults[field])
-    return copy
+            field = _with_default(field, defaults[field])
+        fields[field] = field_type
+    return vol.Schema(fields, required=schema.required, extra=schema.extra)
+
+
+def _with_default(field, value):
+    """Return a copy of a schema marker with a new default value."""
+    field = copy.copy(field)
+    field.default = vol.default_factory(value)
+    return field
 
 
 def platform_schema(platform, dps_strings, allow_id=True, yaml=False):
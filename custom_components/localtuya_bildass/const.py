@@ -41,7 +41,7 @@ CONF_ADD_NEW_ENTITY = "add_new_entity"
 CONF_DELETE_ENTITY = "delete_entity"
 
 # Hub categories that don't have local keys
-HUB_CATEGORIES = [
+HUB_CATEGORIES = frozenset([
     "wgsxj",      # Gateway camera
     "lyqwg",      # Router
     "bywg",       # IoT edge gateway
@@ -55,7 +55,7 @@ HUB_CATEGORIES = [
     "gywg",       # Industrial gateway
     "cnwg",       # Energy gateway
     "wnykq",      # Smart IR
-]
+])
 
 # Platforms in this list must support config flows
 PLATFORMS = [
@@ -218,7 +218,7 @@ async def async_load_device_library() -> dict[str, dict]:
 
     Runs the blocking file I/O in an executor to avoid blocking the event loop.
     """
-    return await asyncio.get_event_loop().run_in_executor(None, load_device_library)
+    return await asyncio.get_running_loop().run_in_executor(None, load_device_library)
 
 
 async def async_get_library_stats() -> dict:
@@ -226,7 +226,7 @@ async def async_get_library_stats() -> dict:
 
     Runs the blocking file I/O in an executor to avoid blocking the event loop.
     """
-    return await asyncio.get_event_loop().run_in_executor(None, get_library_stats)
+    return await asyncio.get_running_loop().run_in_executor(None, get_library_stats)
 
 
 async def async_reload_library() -> None:
@@ -234,4 +234,4 @@ async def async_reload_library() -> None:
 
     Runs the blocking file I/O in an executor to avoid blocking the event loop.
     """
-    await asyncio.get_event_loop().run_in_executor(None, reload_library)
+    await asyncio.get_running_loop().run_in_executor(None, reload_library)
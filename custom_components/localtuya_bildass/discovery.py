@@ -4,15 +4,45 @@ Based on tuya-convert discovery script:
 https://github.com/ct-Open-Source/tuya-convert/blob/master/scripts/tuya-discovery.py
 """
 import asyncio
-import json
 import logging
+import socket
 
-from .pytuya import decrypt_udp, UDP_KEY
+from .pytuya import DecodeError, PREFIX_6699_BIN, UDP_KEY, decrypt_udp, unpack_message
+from .pytuya.constants import (
+    AES_BLOCK_SIZE,
+    FOOTER_SIZE_55AA_CRC,
+    HEADER_SIZE_55AA_RECV,
+    UINT32_BE,
+)
+from .pytuya.serialization import json_loads
 
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_TIMEOUT = 6.0
 
+# Larger receive buffer so bursts of broadcasts from many devices aren't dropped
+RECEIVE_BUFFER_SIZE = 1 << 20
+
+
+def _payload_55aa(data):
+    """Strip 55AA header and footer (memoryview slice, no copy)."""
+    return memoryview(data)[HEADER_SIZE_55AA_RECV:-FOOTER_SIZE_55AA_CRC]
+
+
+def _payload_6699(data):
+    """Unpack a protocol 3.5 broadcast (GCM-encrypted 6699 frame)."""
+    try:
+        return unpack_message(data, UDP_KEY, 3.5).payload
+    except (DecodeError, ValueError):
+        _LOGGER.debug("Failed to unpack 6699 broadcast")
+        return None
+
+
+# Payload extractor by frame prefix; anything unknown is treated as 55AA
+_PAYLOAD_EXTRACTORS = {
+    int.from_bytes(PREFIX_6699_BIN, "big"): _payload_6699,
+}
+
 
 class TuyaDiscovery(asyncio.DatagramProtocol):
     """Datagram handler listening for Tuya broadcast messages."""
@@ -22,6 +52,8 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
         self.devices = {}
         self._listeners = []
         self._callback = callback
+        # Last raw broadcast and its decoded form per source IP
+        self._last_broadcast = {}
 
     async def start(self):
         """Start discovery by listening to broadcasts."""
@@ -37,6 +69,14 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
         )
 
         self._listeners = await asyncio.gather(listener, encrypted_listener)
+        for transport, _ in self._listeners:
+            sock = transport.get_extra_info("socket")
+            if sock is None:
+                continue
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+            except OSError as ex:
+                _LOGGER.debug("Could not enlarge discovery receive buffer: %s", ex)
         _LOGGER.debug("Listening to broadcasts on UDP port 6666 and 6667")
 
     def close(self):
@@ -47,29 +87,45 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
 
     def datagram_received(self, data, addr):
         """Handle received broadcast message."""
-        # Strip Tuya header (20 bytes) and footer (8 bytes)
-        data = data[20:-8]
-
-        # Try to decrypt (encrypted broadcasts on port 6667)
-        try:
-            data = decrypt_udp(data)
-            if isinstance(data, bytes):
-                data = data.decode("utf-8")
-        except Exception:
-            # Unencrypted broadcast on port 6666
+        # Devices repeat the same broadcast every few seconds; reuse the
+        # previous decode instead of decrypting and parsing it again
+        last = self._last_broadcast.get(addr[0])
+        if last is not None and last[0] == data:
+            self.device_found(last[1])
+            return
+
+        if len(data) < UINT32_BE.size:
+            return
+
+        raw = data
+        prefix = UINT32_BE.unpack_from(data)[0]
+        data = _PAYLOAD_EXTRACTORS.get(prefix, _payload_55aa)(data)
+        if data is None:
+            return
+
+        # Pick the decode path from the payload shape instead of trying
+        # decryption first: plain JSON (port 6666) starts with "{", while
+        # encrypted broadcasts (port 6667) are whole AES blocks.
+        if data[:1] == b"{":
+            data = bytes(data)
+        else:
+            if not data or len(data) % AES_BLOCK_SIZE:
+                _LOGGER.debug("Ignoring broadcast with unexpected length %d", len(data))
+                return
             try:
-                if isinstance(data, bytes):
-                    data = data.decode("utf-8")
-            except Exception:
-                _LOGGER.debug("Failed to decode broadcast data")
+                data = decrypt_udp(data)
+            except ValueError:
+                _LOGGER.debug("Failed to decrypt broadcast data")
                 return
 
-        # Parse JSON
+        # Parse JSON straight from bytes (no intermediate UTF-8 decode)
         try:
-            decoded = json.loads(data)
-            self.device_found(decoded)
-        except json.JSONDecodeError:
+            decoded = json_loads(data)
+        except ValueError:
             _LOGGER.debug("Failed to parse broadcast JSON: %s", data[:100])
+            return
+        self._last_broadcast[addr[0]] = (raw, decoded)
+        self.device_found(decoded)
 
     def device_found(self, device):
         """Handle discovered device."""
@@ -28,30 +28,34 @@ DEFAULT_PRECISION = 2
 NUMBER_DEVICE_CLASSES = [cls.value for cls in NumberDeviceClass]
 
 
+# Built once at import: the schema does not depend on the device's DPS
+_FLOW_SCHEMA = {
+    vol.Optional(CONF_MIN_VALUE, default=DEFAULT_MIN): vol.All(
+        vol.Coerce(float),
+        vol.Range(min=-1000000.0, max=1000000.0),
+    ),
+    vol.Required(CONF_MAX_VALUE, default=DEFAULT_MAX): vol.All(
+        vol.Coerce(float),
+        vol.Range(min=-1000000.0, max=1000000.0),
+    ),
+    vol.Required(CONF_STEPSIZE_VALUE, default=DEFAULT_STEP): vol.All(
+        vol.Coerce(float),
+        vol.Range(min=0.0, max=1000000.0),
+    ),
+    vol.Optional(CONF_SCALING): vol.All(
+        vol.Coerce(float), vol.Range(min=-1000000.0, max=1000000.0)
+    ),
+    vol.Optional(CONF_UNIT_OF_MEASUREMENT): str,
+    vol.Optional(CONF_DEVICE_CLASS): vol.In(NUMBER_DEVICE_CLASSES),
+    vol.Required(CONF_RESTORE_ON_RECONNECT): bool,
+    vol.Required(CONF_PASSIVE_ENTITY): bool,
+    vol.Optional(CONF_DEFAULT_VALUE): str,
+}
+
+
 def flow_schema(dps):
     """Return schema used in config flow."""
-    return {
-        vol.Optional(CONF_MIN_VALUE, default=DEFAULT_MIN): vol.All(
-            vol.Coerce(float),
-            vol.Range(min=-1000000.0, max=1000000.0),
-        ),
-        vol.Required(CONF_MAX_VALUE, default=DEFAULT_MAX): vol.All(
-            vol.Coerce(float),
-            vol.Range(min=-1000000.0, max=1000000.0),
-        ),
-        vol.Required(CONF_STEPSIZE_VALUE, default=DEFAULT_STEP): vol.All(
-            vol.Coerce(float),
-            vol.Range(min=0.0, max=1000000.0),
-        ),
-        vol.Optional(CONF_SCALING): vol.All(
-            vol.Coerce(float), vol.Range(min=-1000000.0, max=1000000.0)
-        ),
-        vol.Optional(CONF_UNIT_OF_MEASUREMENT): str,
-        vol.Optional(CONF_DEVICE_CLASS): vol.In(NUMBER_DEVICE_CLASSES),
-        vol.Required(CONF_RESTORE_ON_RECONNECT): bool,
-        vol.Required(CONF_PASSIVE_ENTITY): bool,
-        vol.Optional(CONF_DEFAULT_VALUE): str,
-    }
+    return _FLOW_SCHEMA
 
 
 class LocaltuyaNumber(LocalTuyaEntity, NumberEntity):
@@ -80,6 +84,12 @@ class LocaltuyaNumber(LocalTuyaEntity, NumberEntity):
         if CONF_STEPSIZE_VALUE in self._config:
             self._step_size = self._config.get(CONF_STEPSIZE_VALUE)
 
+        # Scaling is fixed per entity, so resolve it once instead of per update
+        self._scale_factor = self._config.get(CONF_SCALING)
+        self._inv_scale_factor = (
+            1.0 / self._scale_factor if self._scale_factor else None
+        )
+
         # Override standard default value handling to cast to a float
         default_value = self._config.get(CONF_DEFAULT_VALUE)
         if default_value is not None:
@@ -118,17 +128,15 @@ class LocaltuyaNumber(LocalTuyaEntity, NumberEntity):
     def status_updated(self):
         """Device status was updated."""
         state = self.dps(self._dp_id)
-        scale_factor = self._config.get(CONF_SCALING)
-        if scale_factor is not None and isinstance(state, (int, float)):
-            state = round(state * scale_factor, DEFAULT_PRECISION)
+        if self._scale_factor is not None and isinstance(state, (int, float)):
+            state = round(state * self._scale_factor, DEFAULT_PRECISION)
         self._state = state
 
     async def async_set_native_value(self, value: float) -> None:
         """Update the current value."""
-        scale_factor = self._config.get(CONF_SCALING)
-        if scale_factor is not None and scale_factor != 0:
+        if self._inv_scale_factor is not None:
             # Inverse scaling: convert displayed value back to raw DP value
-            value = round(value / scale_factor)
+            value = round(value * self._inv_scale_factor)
         await self._device.set_dp(value, self._dp_id)
 
     # Default value is the minimum value
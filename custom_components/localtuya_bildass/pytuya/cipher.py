@@ -6,16 +6,34 @@ Provides:
 - ECB mode encryption/decryption for Protocol 3.1-3.4
 - GCM mode encryption/decryption for Protocol 3.5
 
+Uses PyCryptodome when installed (much lower per-call overhead for the
+small, few-block messages Tuya devices exchange) and falls back to
+`cryptography` otherwise. GCM prefers `cryptography`'s AESGCM, which goes
+straight to OpenSSL's AEAD code (AES-NI/CLMUL where available).
+
 Based on TinyTuya implementation.
 """
 
 import base64
 from typing import Optional, Tuple
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+try:
+    from Crypto.Cipher import AES
+    _HAS_PYCRYPTODOME = True
+except ImportError:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    _HAS_PYCRYPTODOME = False
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
 
-from .constants import AES_BLOCK_SIZE, GCM_NONCE_SIZE, GCM_TAG_SIZE
+from .constants import AES_BLOCK_SIZE, GCM_NONCE_SIZE, GCM_TAG_SIZE, UDP_KEY
+
+# Valid PKCS7 padding strings, indexed by pad length - 1
+_PKCS7_PADDING = tuple(bytes([n]) * n for n in range(1, AES_BLOCK_SIZE + 1))
 
 
 class AESCipher:
@@ -36,11 +54,20 @@ class AESCipher:
             raise ValueError(f"AES key must be 16 bytes, got {len(key)}")
 
         self.key = key
-        self._ecb_cipher = Cipher(
-            algorithms.AES(key),
-            modes.ECB(),
-            backend=default_backend()
-        )
+        if _HAS_PYCRYPTODOME:
+            # ECB is stateless, so one object serves every call for this key
+            self._ecb_cipher = AES.new(key, AES.MODE_ECB)
+        else:
+            self._ecb_cipher = Cipher(
+                algorithms.AES(key),
+                modes.ECB(),
+                backend=default_backend()
+            )
+        # GCM keys are expanded once; nonces are supplied per call
+        self._aesgcm = AESGCM(key) if AESGCM is not None else None
+        # Whether this key's 6699 frames authenticate without AAD, as
+        # learned by unpack_message on the first successful frame
+        self.gcm_no_aad = False
 
     # =========================================================================
     # ECB MODE (Protocol 3.1-3.4)
@@ -59,6 +86,9 @@ class AESCipher:
         if pad:
             plaintext = self._pkcs7_pad(plaintext)
 
+        if _HAS_PYCRYPTODOME:
+            return self._ecb_cipher.encrypt(plaintext)
+
         encryptor = self._ecb_cipher.encryptor()
         return encryptor.update(plaintext) + encryptor.finalize()
 
@@ -72,8 +102,11 @@ class AESCipher:
         Returns:
             Decrypted plaintext
         """
-        decryptor = self._ecb_cipher.decryptor()
-        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        if _HAS_PYCRYPTODOME:
+            plaintext = self._ecb_cipher.decrypt(ciphertext)
+        else:
+            decryptor = self._ecb_cipher.decryptor()
+            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
 
         if unpad:
             plaintext = self._pkcs7_unpad(plaintext)
@@ -129,6 +162,16 @@ class AESCipher:
         if len(nonce) != GCM_NONCE_SIZE:
             raise ValueError(f"GCM nonce must be {GCM_NONCE_SIZE} bytes, got {len(nonce)}")
 
+        if self._aesgcm is not None:
+            sealed = self._aesgcm.encrypt(nonce, plaintext, aad or None)
+            return sealed[:-GCM_TAG_SIZE], sealed[-GCM_TAG_SIZE:]
+
+        if _HAS_PYCRYPTODOME:
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+            if aad:
+                cipher.update(aad)
+            return cipher.encrypt_and_digest(plaintext)
+
         cipher = Cipher(
             algorithms.AES(self.key),
             modes.GCM(nonce),
@@ -143,6 +186,42 @@ class AESCipher:
 
         return ciphertext, encryptor.tag
 
+    def encrypt_gcm_into(
+        self,
+        plaintext: bytes,
+        nonce: bytes,
+        aad: Optional[bytes],
+        output
+    ) -> None:
+        """Encrypt data using AES-GCM mode, writing ciphertext and tag into a buffer.
+
+        Args:
+            plaintext: Data to encrypt
+            nonce: 12-byte nonce/IV for GCM
+            aad: Additional authenticated data (optional)
+            output: Writable buffer of exactly len(plaintext) + 16 bytes;
+                receives the ciphertext followed by the GCM tag
+        """
+        if len(nonce) != GCM_NONCE_SIZE:
+            raise ValueError(f"GCM nonce must be {GCM_NONCE_SIZE} bytes, got {len(nonce)}")
+
+        if self._aesgcm is not None:
+            # AESGCM already returns ciphertext + tag in frame order
+            output[:] = self._aesgcm.encrypt(nonce, plaintext, aad or None)
+            return
+
+        if _HAS_PYCRYPTODOME:
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+            if aad:
+                cipher.update(aad)
+            cipher.encrypt(plaintext, output=output[:-GCM_TAG_SIZE])
+            output[-GCM_TAG_SIZE:] = cipher.digest()
+            return
+
+        ciphertext, tag = self.encrypt_gcm(plaintext, nonce, aad)
+        output[:-GCM_TAG_SIZE] = ciphertext
+        output[-GCM_TAG_SIZE:] = tag
+
     def decrypt_gcm(
         self,
         ciphertext: bytes,
@@ -162,13 +241,24 @@ class AESCipher:
             Decrypted plaintext
 
         Raises:
-            InvalidTag: If authentication fails
+            ValueError (PyCryptodome) or InvalidTag (cryptography): If
+            authentication fails
         """
         if len(nonce) != GCM_NONCE_SIZE:
             raise ValueError(f"GCM nonce must be {GCM_NONCE_SIZE} bytes, got {len(nonce)}")
         if len(tag) != GCM_TAG_SIZE:
             raise ValueError(f"GCM tag must be {GCM_TAG_SIZE} bytes, got {len(tag)}")
 
+        if self._aesgcm is not None:
+            # AESGCM expects the tag appended to the ciphertext
+            return self._aesgcm.decrypt(nonce, b"".join((ciphertext, tag)), aad or None)
+
+        if _HAS_PYCRYPTODOME:
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+            if aad:
+                cipher.update(aad)
+            return cipher.decrypt_and_verify(ciphertext, tag)
+
         cipher = Cipher(
             algorithms.AES(self.key),
             modes.GCM(nonce, tag),
@@ -202,6 +292,10 @@ class AESCipher:
             raise ValueError(f"Nonce must be {GCM_NONCE_SIZE} bytes, got {len(nonce)}")
 
         # CTR counter starts at 2 for GCM (0 and 1 are used for auth)
+        if _HAS_PYCRYPTODOME:
+            cipher = AES.new(self.key, AES.MODE_CTR, nonce=nonce, initial_value=2)
+            return cipher.decrypt(ciphertext)
+
         counter = nonce + b"\x00\x00\x00\x02"
 
         cipher = Cipher(
@@ -217,10 +311,11 @@ class AESCipher:
     # PADDING
     # =========================================================================
 
-    def _pkcs7_pad(self, data: bytes) -> bytes:
+    @staticmethod
+    def _pkcs7_pad(data: bytes) -> bytes:
         """Apply PKCS7 padding to data."""
-        pad_len = AES_BLOCK_SIZE - (len(data) % AES_BLOCK_SIZE)
-        return data + bytes([pad_len] * pad_len)
+        pad_len = AES_BLOCK_SIZE - (len(data) & (AES_BLOCK_SIZE - 1))
+        return data + _PKCS7_PADDING[pad_len - 1]
 
     @staticmethod
     def _pkcs7_unpad(data: bytes) -> bytes:
@@ -231,7 +326,7 @@ class AESCipher:
         if pad_len > AES_BLOCK_SIZE or pad_len == 0:
             return data  # Invalid padding, return as-is
         # Verify padding bytes
-        if data[-pad_len:] != bytes([pad_len] * pad_len):
+        if not data.endswith(_PKCS7_PADDING[pad_len - 1]):
             return data  # Invalid padding
         return data[:-pad_len]
 
@@ -240,6 +335,10 @@ class AESCipher:
 # HELPER FUNCTIONS
 # =============================================================================
 
+# The UDP key is fixed, so a single cipher serves every broadcast
+_UDP_CIPHER = AESCipher(UDP_KEY)
+
+
 def encrypt_udp(data: bytes) -> bytes:
     """Encrypt UDP broadcast data using shared UDP key.
 
@@ -249,9 +348,7 @@ def encrypt_udp(data: bytes) -> bytes:
     Returns:
         Encrypted data
     """
-    from .constants import UDP_KEY
-    cipher = AESCipher(UDP_KEY)
-    return cipher.encrypt_ecb(data, pad=True)
+    return _UDP_CIPHER.encrypt_ecb(data, pad=True)
 
 
 def decrypt_udp(data: bytes) -> bytes:
@@ -263,6 +360,4 @@ def decrypt_udp(data: bytes) -> bytes:
     Returns:
         Decrypted data
     """
-    from .constants import UDP_KEY
-    cipher = AESCipher(UDP_KEY)
-    return cipher.decrypt_ecb(data, unpad=True)
+    return _UDP_CIPHER.decrypt_ecb(data, unpad=True)
@@ -11,6 +11,8 @@ Protocol versions:
 - 3.5: Use 6699 prefix, GCM encryption, GCM tag for auth
 """
 
+import struct
+
 # =============================================================================
 # MESSAGE PREFIXES AND SUFFIXES
 # =============================================================================
@@ -98,9 +100,13 @@ PROTOCOL_3X_HEADER_PAD = 12 * b"\x00"
 # MESSAGE STRUCTURE FORMATS (struct module)
 # =============================================================================
 
+# Each format also has a precompiled struct.Struct, so the hot pack/unpack
+# paths don't re-parse the format string on every message
+
 # 55AA format header: prefix(4) + seqno(4) + cmd(4) + length(4)
 HEADER_FMT_55AA = ">4I"  # 4 x uint32 big-endian
 HEADER_SIZE_55AA = 16
+HEADER_STRUCT_55AA = struct.Struct(HEADER_FMT_55AA)
 
 # 55AA format with retcode: prefix(4) + seqno(4) + cmd(4) + length(4) + retcode(4)
 HEADER_FMT_55AA_RECV = ">5I"  # 5 x uint32 big-endian
@@ -109,6 +115,10 @@ HEADER_SIZE_55AA_RECV = 20
 # 6699 format header: prefix(4) + version(1) + reserved(1) + seqno(4) + cmd(4) + length(4)
 HEADER_FMT_6699 = ">IBBIII"  # uint32 + 2x uint8 + 3x uint32
 HEADER_SIZE_6699 = 18
+HEADER_STRUCT_6699 = struct.Struct(HEADER_FMT_6699)
+
+# Single big-endian uint32: frame prefix, retcode and frame suffix
+UINT32_BE = struct.Struct(">I")
 
 # Retcode format
 RETCODE_FMT = ">I"
@@ -117,10 +127,12 @@ RETCODE_SIZE = 4
 # 55AA footer with CRC32: crc(4) + suffix(4)
 FOOTER_FMT_55AA_CRC = ">II"
 FOOTER_SIZE_55AA_CRC = 8
+FOOTER_STRUCT_55AA_CRC = struct.Struct(FOOTER_FMT_55AA_CRC)
 
 # 55AA footer with HMAC: hmac(32) + suffix(4)
 FOOTER_FMT_55AA_HMAC = ">32sI"
 FOOTER_SIZE_55AA_HMAC = 36
+FOOTER_STRUCT_55AA_HMAC = struct.Struct(FOOTER_FMT_55AA_HMAC)
 
 # 6699 footer: tag(16) + suffix(4)
 FOOTER_FMT_6699 = ">16sI"
@@ -8,14 +8,14 @@ Supports Protocol versions 3.1, 3.2, 3.3, 3.4, and 3.5.
 
 import asyncio
 import hmac
-import json
 import logging
 import os
+import re
 import time
 import weakref
 from abc import ABC, abstractmethod
-from hashlib import sha256
-from typing import Any, Callable, Dict, Optional
+from hashlib import md5
+from typing import Any, Callable, Dict, NamedTuple, Optional
 
 from .cipher import AESCipher
 from .constants import (
@@ -24,7 +24,7 @@ from .constants import (
     CMD_HEART_BEAT, CMD_STATUS, CMD_UPDATE_DPS,
     CMD_SESS_KEY_NEG_START, CMD_SESS_KEY_NEG_RESP, CMD_SESS_KEY_NEG_FINISH,
     # Protocol
-    PREFIX_55AA, PREFIX_6699,
+    PREFIX_55AA, PREFIX_55AA_BIN, PREFIX_6699, PREFIX_6699_BIN, UINT32_BE,
     VERSION_31, VERSION_33, VERSION_34, VERSION_35,
     PROTOCOL_3X_HEADER_PAD,
     NO_PROTOCOL_HEADER_CMDS, SESSION_KEY_CMDS,
@@ -41,25 +41,73 @@ from .message import (
     DecodeError, SessionKeyError, TimeoutError as TuyaTimeoutError
 )
 from .protocol import (
-    parse_header, pack_message, unpack_message,
+    parse_header, pack_message, unpack_message, calculate_hmac_sha256,
     HEADER_SIZE_55AA, HEADER_SIZE_6699,
 )
+from .serialization import json_dumps, json_loads
 
 _LOGGER = logging.getLogger(__name__)
 
+# Bound once so the per-call debug guard skips the module attribute lookup
+_DEBUG = logging.DEBUG
+
+# Either frame prefix, so resyncing after junk scans the buffer only once
+_FRAME_PREFIX_RE = re.compile(
+    re.escape(PREFIX_55AA_BIN) + b"|" + re.escape(PREFIX_6699_BIN)
+)
+
+# Size of the per-connection buffer the event loop reads into
+_RECV_BUFFER_SIZE = 16384
+
+# UPDATE_DPS_WHITELIST keyed the way DPS appear in dps_cache
+_UPDATE_DPS_WHITELIST_KEYS = {str(dp): dp for dp in UPDATE_DPS_WHITELIST}
+
+# DPS ranges probed by detect_available_dps(), with the string keys each
+# probe requests (DP 1 is always included)
+_DETECT_DPS_RANGES = tuple(
+    (dps_range, ("1", *map(str, range(*dps_range))))
+    for dps_range in ((2, 11), (11, 21), (21, 31), (100, 111))
+)
+
+# Last (second, string) pair handed out by _timestamp_str()
+_last_timestamp = [0, "0"]
+
+
+def _timestamp_int() -> int:
+    """Return the current Unix time in whole seconds."""
+    return int(time.time())
+
+
+def _timestamp_str() -> str:
+    """Return the current Unix time as a string, reused within a second."""
+    now = int(time.time())
+    cached = _last_timestamp
+    if now != cached[0]:
+        cached[1] = str(now)
+        cached[0] = now
+    return cached[1]
+
 
 # =============================================================================
 # LOGGING ADAPTER
 # =============================================================================
 
+def _log_prefix(device_id: str) -> str:
+    """Return the "[abc...xyz] " tag that prefixes per-device log lines."""
+    # Show first and last 3 chars of device ID
+    short_id = f"{device_id[:3]}...{device_id[-3:]}" if len(device_id) > 6 else device_id
+    return f"[{short_id}] "
+
+
 class TuyaLoggingAdapter(logging.LoggerAdapter):
     """Adapter that adds device ID to log messages."""
 
+    def __init__(self, logger, extra):
+        super().__init__(logger, extra)
+        self._prefix = _log_prefix(self.extra.get("device_id", "???"))
+
     def process(self, msg, kwargs):
-        dev_id = self.extra.get("device_id", "???")
-        # Show first and last 3 chars of device ID
-        short_id = f"{dev_id[:3]}...{dev_id[-3:]}" if len(dev_id) > 6 else dev_id
-        return f"[{short_id}] {msg}", kwargs
+        return f"{self._prefix}{msg}", kwargs
 
 
 class ContextualLogger:
@@ -73,6 +121,7 @@ class ContextualLogger:
         """Initialize logger."""
         self._logger = None
         self._enable_debug = False
+        self._prefix = ""
 
     def set_logger(self, logger, device_id, enable_debug=False):
         """Set the base logger to use.
@@ -83,32 +132,37 @@ class ContextualLogger:
             enable_debug: Whether to enable debug logging
         """
         self._enable_debug = enable_debug
-        self._logger = TuyaLoggingAdapter(logger, {"device_id": device_id})
+        self._logger = logger
+        self._prefix = _log_prefix(device_id)
 
     def debug(self, msg, *args):
         """Log debug message (only if debug enabled)."""
-        if self._enable_debug and self._logger:
-            self._logger.debug(msg, *args)
+        if (
+            self._enable_debug
+            and self._logger
+            and self._logger.isEnabledFor(_DEBUG)
+        ):
+            self._logger.debug(f"{self._prefix}{msg}", *args)
 
     def info(self, msg, *args):
         """Log info message."""
         if self._logger:
-            self._logger.info(msg, *args)
+            self._logger.info(f"{self._prefix}{msg}", *args)
 
     def warning(self, msg, *args):
         """Log warning message."""
         if self._logger:
-            self._logger.warning(msg, *args)
+            self._logger.warning(f"{self._prefix}{msg}", *args)
 
     def error(self, msg, *args):
         """Log error message."""
         if self._logger:
-            self._logger.error(msg, *args)
+            self._logger.error(f"{self._prefix}{msg}", *args)
 
     def exception(self, msg, *args):
         """Log exception with traceback."""
         if self._logger:
-            self._logger.exception(msg, *args)
+            self._logger.exception(f"{self._prefix}{msg}", *args)
 
 
 # =============================================================================
@@ -172,19 +226,22 @@ class MessageDispatcher:
             status_callback: Callback for status update messages
             enable_debug: Enable debug logging
         """
-        self.buffer = b""
-        self.listeners: Dict[int, Any] = {}
+        self.buffer = bytearray()
+        self.listeners: Dict[int, asyncio.Future] = {}
         self.protocol_version = protocol_version
         self.device_key = device_key
         self.session_key: Optional[bytes] = None
         self.status_callback = status_callback
         self.enable_debug = enable_debug
 
+        # AES contexts for this connection, keyed by device/session key
+        self._ciphers: Dict[bytes, AESCipher] = {}
+
         self._logger = TuyaLoggingAdapter(_LOGGER, {"device_id": device_id})
 
     def debug(self, msg: str, *args) -> None:
         """Log debug message if enabled."""
-        if self.enable_debug:
+        if self.enable_debug and self._logger.isEnabledFor(_DEBUG):
             self._logger.debug(msg, *args)
 
     def warning(self, msg: str, *args) -> None:
@@ -195,12 +252,22 @@ class MessageDispatcher:
         """Set session key for decryption."""
         self.session_key = key
 
+    def cipher(self, key: bytes) -> AESCipher:
+        """Return the connection's cipher for a key, creating it once."""
+        cipher = self._ciphers.get(key)
+        if cipher is None:
+            # Only the device key and current session key are live; drop
+            # ciphers for stale session keys from earlier negotiations
+            if len(self._ciphers) >= 4:
+                self._ciphers.clear()
+            cipher = self._ciphers[key] = AESCipher(key)
+        return cipher
+
     def abort(self) -> None:
         """Abort all waiting listeners."""
-        for seqno, item in list(self.listeners.items()):
-            if isinstance(item, asyncio.Semaphore):
-                self.listeners[seqno] = None
-                item.release()
+        for waiter in list(self.listeners.values()):
+            if not waiter.done():
+                waiter.set_result(None)
 
     async def wait_for(self, seqno: int, cmd: int, timeout: float = DEFAULT_TIMEOUT) -> Optional[TuyaMessage]:
         """Wait for response with given sequence number.
@@ -220,116 +287,158 @@ class MessageDispatcher:
             raise RuntimeError(f"Listener already exists for seqno {seqno}")
 
         self.debug("Waiting for seqno %d (cmd %d)", seqno, cmd)
-        self.listeners[seqno] = asyncio.Semaphore(0)
+        # A bare future (unlike a Semaphore.acquire() coroutine) is awaited
+        # by wait_for directly, without wrapping it in a task
+        waiter = asyncio.get_running_loop().create_future()
+        self.listeners[seqno] = waiter
 
         try:
-            await asyncio.wait_for(self.listeners[seqno].acquire(), timeout=timeout)
+            result = await asyncio.wait_for(waiter, timeout=timeout)
         except asyncio.TimeoutError:
             self.debug("Timeout waiting for seqno %d", seqno)
             del self.listeners[seqno]
             raise
 
-        result = self.listeners.pop(seqno)
-        return result if isinstance(result, TuyaMessage) else None
+        del self.listeners[seqno]
+        return result
 
     def add_data(self, data: bytes) -> None:
         """Add received data to buffer and process messages."""
-        self.buffer += data
+        self.buffer.extend(data)
         self._process_buffer()
 
     def _process_buffer(self) -> None:
-        """Process buffered data and dispatch complete messages."""
-        while self.buffer:
-            # Determine header size based on prefix
-            if self.buffer[:4] == b"\x00\x00\x66\x99":
+        """Process buffered data and dispatch complete messages.
+
+        Frames are walked by offset and consumed bytes are deleted from the
+        bytearray once at the end, so neither appending data nor consuming
+        a burst of frames recopies the whole pending buffer.
+        """
+        buffer = self.buffer
+        end = len(buffer)
+        offset = 0
+
+        # Keys can't change within a batch (the session key is only set from
+        # the negotiation coroutine), so resolve the data cipher once
+        device_key = self.device_key
+        data_key = self.session_key if self.session_key else device_key
+        data_cipher = None
+
+        while offset < end:
+            # Possibly a prefix split across reads
+            if end - offset < UINT32_BE.size:
+                break
+
+            # Determine header size based on prefix; frames normally start
+            # right at the offset, so one integer read settles it and only
+            # junk needs a search
+            prefix = UINT32_BE.unpack_from(buffer, offset)[0]
+            if prefix == PREFIX_55AA:
+                header_size = HEADER_SIZE_55AA
+            elif prefix == PREFIX_6699:
                 header_size = HEADER_SIZE_6699
             else:
-                header_size = HEADER_SIZE_55AA
+                offset = self._resync(buffer, offset, end)
+                continue
 
             # Need at least header to continue
-            if len(self.buffer) < header_size:
+            if end - offset < header_size:
                 break
 
             # Parse header
             try:
-                header = parse_header(self.buffer)
+                header = parse_header(buffer, offset)
             except DecodeError as e:
                 self.warning("Failed to parse header: %s, clearing buffer", e)
-                self.buffer = b""
+                offset = end
                 break
 
             # Need complete message
-            if len(self.buffer) < header.total_length:
+            frame_end = offset + header.total_length
+            if end < frame_end:
                 break
 
             # Determine decryption key
-            # Session negotiation always uses device key
-            if header.cmd in SESSION_KEY_CMDS:
-                key = self.device_key
+            # Session negotiation always uses device key; without a session
+            # key that is the data key anyway, so the command isn't checked
+            if data_key is not device_key and header.cmd in SESSION_KEY_CMDS:
+                key = device_key
+                cipher = self.cipher(key)
             else:
-                key = self.session_key if self.session_key else self.device_key
+                key = data_key
+                if data_cipher is None:
+                    data_cipher = self.cipher(key)
+                cipher = data_cipher
+
+            frame = bytes(memoryview(buffer)[offset:frame_end])
+            offset = frame_end
 
             # Unpack message
             try:
                 msg = unpack_message(
-                    self.buffer,
+                    frame,
                     key=key,
                     protocol_version=self.protocol_version,
-                    header=header
+                    header=header,
+                    cipher=cipher
                 )
-                self.buffer = self.buffer[header.total_length:]
-
-                # Dispatch message - also wrapped in try-catch for safety
-                try:
-                    self._dispatch(msg)
-                except Exception as e:
-                    self.warning("Exception in _dispatch: %s", e)
-
             except DecodeError as e:
                 self.warning("Failed to unpack message: %s", e)
-                self.buffer = b""
+                offset = end
                 break
             except Exception as e:
                 # Catch any unexpected exception to prevent connection drop
                 self.warning("Unexpected error processing message: %s", e)
-                self.buffer = self.buffer[header.total_length:]  # Skip this message
+                continue  # Skip this message
+
+            # Dispatch message - also wrapped in try-catch for safety
+            try:
+                self._dispatch(msg)
+            except Exception as e:
+                self.warning("Exception in _dispatch: %s", e)
+
+        if offset:
+            del buffer[:offset]
+
+    def _resync(self, buffer: bytearray, offset: int, end: int) -> int:
+        """Return the offset of the next frame prefix after unframed data."""
+        match = _FRAME_PREFIX_RE.search(buffer, offset + 1)
+        # Keep a possibly split prefix at the tail when nothing is found
+        next_offset = match.start() if match else max(offset + 1, end - len(PREFIX_55AA_BIN) + 1)
+        self.warning("Skipping %d bytes of unframed data", next_offset - offset)
+        return next_offset
 
     def _dispatch(self, msg: TuyaMessage) -> None:
         """Dispatch message to appropriate handler."""
-        self.debug("Dispatching msg: cmd=%d seqno=%d retcode=%d payload_len=%d",
-                   msg.cmd, msg.seqno, msg.retcode, len(msg.payload))
+        if self.enable_debug and self._logger.isEnabledFor(_DEBUG):
+            self._logger.debug("Dispatching msg: cmd=%d seqno=%d retcode=%d payload_len=%d",
+                               msg.cmd, msg.seqno, msg.retcode, len(msg.payload))
 
         # Check if someone is waiting for this seqno
-        if msg.seqno in self.listeners:
-            sem = self.listeners[msg.seqno]
-            if isinstance(sem, asyncio.Semaphore):
-                self.listeners[msg.seqno] = msg
-                sem.release()
+        listeners = self.listeners
+        waiter = listeners.get(msg.seqno)
+        if waiter is not None:
+            self._resolve(waiter, msg)
             return
 
         # Fallback for protocol 3.4+: device may respond with seqno=0 or different seqno
         # Only for control/query responses, NOT for STATUS (which should go to status_callback)
         if msg.cmd in (CMD_DP_QUERY_NEW, CMD_CONTROL_NEW):
             # First try seqno+1 fallback
-            if (msg.seqno + 1) in self.listeners:
-                alt_seqno = msg.seqno + 1
+            alt_seqno = msg.seqno + 1
+            waiter = listeners.get(alt_seqno)
+            if waiter is not None:
                 self.debug("Seqno mismatch for cmd=%d, using fallback seqno %d -> %d", msg.cmd, msg.seqno, alt_seqno)
-                sem = self.listeners[alt_seqno]
-                if isinstance(sem, asyncio.Semaphore):
-                    self.listeners[alt_seqno] = msg
-                    sem.release()
+                self._resolve(waiter, msg)
                 return
             # For seqno=0 responses or near-match seqnos, try to find first available listener
-            if self.listeners:
-                for listener_seqno in list(self.listeners.keys()):
+            if listeners:
+                for listener_seqno, waiter in list(listeners.items()):
                     if listener_seqno >= 0:  # Skip special negative seqnos
                         # Accept if seqno matches, is 0, or is close (within 2)
                         if msg.seqno == 0 or abs(msg.seqno - listener_seqno) <= 2:
                             self.debug("Routing cmd=%d seqno=%d to listener seqno=%d", msg.cmd, msg.seqno, listener_seqno)
-                            sem = self.listeners[listener_seqno]
-                            if isinstance(sem, asyncio.Semaphore):
-                                self.listeners[listener_seqno] = msg
-                                sem.release()
+                            self._resolve(waiter, msg)
                             return
 
         # Handle special message types
@@ -339,8 +448,9 @@ class MessageDispatcher:
             self._dispatch_special(self.SESS_KEY_SEQNO, msg)
         elif msg.cmd in (CMD_UPDATE_DPS, CMD_STATUS):
             # Check for reset listener first
-            if self.RESET_SEQNO in self.listeners:
-                self._dispatch_special(self.RESET_SEQNO, msg)
+            waiter = listeners.get(self.RESET_SEQNO)
+            if waiter is not None:
+                self._resolve(waiter, msg)
             elif msg.cmd == CMD_STATUS:
                 # Unsolicited status update - wrap in try-catch to prevent connection drop
                 try:
@@ -354,18 +464,41 @@ class MessageDispatcher:
 
     def _dispatch_special(self, special_seqno: int, msg: TuyaMessage) -> None:
         """Dispatch to special sequence number listener."""
-        if special_seqno in self.listeners:
-            sem = self.listeners[special_seqno]
-            if isinstance(sem, asyncio.Semaphore):
-                self.listeners[special_seqno] = msg
-                sem.release()
+        waiter = self.listeners.get(special_seqno)
+        if waiter is not None:
+            self._resolve(waiter, msg)
+
+    @staticmethod
+    def _resolve(waiter: asyncio.Future, msg: TuyaMessage) -> None:
+        """Hand msg to a waiting listener, unless it already has one."""
+        if not waiter.done():
+            waiter.set_result(msg)
 
 
 # =============================================================================
 # TUYA PROTOCOL (asyncio.Protocol implementation)
 # =============================================================================
 
-class TuyaProtocol(asyncio.Protocol):
+class _PayloadTemplate(NamedTuple):
+    """Command payload template resolved for one device type and command.
+
+    Attributes:
+        json_data: Template dict with device info filled in
+        timestamp: Factory for the "t" field, or None if there is none
+        cmd: Command to send (after any override)
+        data_key: Key that data points are stored under
+        request_dps: Whether to query with the device's dps_to_request
+        message: Ready-built message for templates that never change
+    """
+    json_data: Dict[str, Any]
+    timestamp: Optional[Callable[[], Any]]
+    cmd: int
+    data_key: str
+    request_dps: bool
+    message: Optional[MessagePayload]
+
+
+class TuyaProtocol(asyncio.BufferedProtocol):
     """Asyncio protocol implementation for Tuya devices."""
 
     def __init__(
@@ -403,6 +536,13 @@ class TuyaProtocol(asyncio.Protocol):
 
         self._logger = TuyaLoggingAdapter(_LOGGER, {"device_id": device_id})
         self.transport: Optional[asyncio.Transport] = None
+        # Reads land in one reusable buffer instead of a new bytes object
+        # per recv; the dispatcher copies what it needs out of it
+        self._recv_buffer = memoryview(bytearray(_RECV_BUFFER_SIZE))
+        # Fire-and-forget frame held back to go out with the next write
+        self._pending_write: Optional[bytes] = None
+        # Loop time of the last acknowledged heartbeat
+        self._last_heartbeat: float = 0
         self.on_connected = on_connected
         self.listener = weakref.ref(listener)
 
@@ -412,6 +552,20 @@ class TuyaProtocol(asyncio.Protocol):
         # Device type affects payload format
         self._set_device_type()
 
+        # Version header prepended to most commands (v3.2+). v3.4+ puts it
+        # inside the encrypted payload, v3.2-3.3 in front of the ciphertext,
+        # and v3.2 devices expect the 3.3 header.
+        if protocol_version >= 3.5:
+            self._version_header = VERSION_35 + PROTOCOL_3X_HEADER_PAD
+        elif protocol_version >= 3.4:
+            self._version_header = VERSION_34 + PROTOCOL_3X_HEADER_PAD
+        elif protocol_version >= 3.2:
+            self._version_header = VERSION_33 + PROTOCOL_3X_HEADER_PAD
+        else:
+            self._version_header = b""
+        # Commands that are sent without the version header
+        self._command_headers: Dict[int, bytes] = dict.fromkeys(NO_PROTOCOL_HEADER_CMDS, b"")
+
         # DPS tracking
         self.dps_cache: Dict[str, Any] = {}
         self.dps_to_request: Dict[str, None] = {}
@@ -446,9 +600,22 @@ class TuyaProtocol(asyncio.Protocol):
         else:
             self.device_type = DEVICE_TYPE_0A
 
+    @property
+    def device_type(self) -> str:
+        """Device type that selects the payload format."""
+        return self._device_type
+
+    @device_type.setter
+    def device_type(self, value: str) -> None:
+        """Switch device type and resolve its payload templates up front."""
+        self._device_type = value
+        self._payload_templates: Dict[int, _PayloadTemplate] = {}
+        for command in PAYLOAD_DICT[DEVICE_TYPE_0A].keys() | PAYLOAD_DICT.get(value, {}).keys():
+            self._payload_template(command)
+
     def debug(self, msg: str, *args) -> None:
         """Log debug if enabled."""
-        if self.enable_debug:
+        if self.enable_debug and self._logger.isEnabledFor(_DEBUG):
             self._logger.debug(msg, *args)
 
     # =========================================================================
@@ -458,11 +625,20 @@ class TuyaProtocol(asyncio.Protocol):
     def connection_made(self, transport: asyncio.Transport) -> None:
         """Called when connection is established."""
         self.transport = transport
+        self._pending_write = None
         print(f"*** CONNECTION_MADE for {self.device_id} ***")
         self._logger.info("TCP connection established to device")
         self.debug("Connection established")
         self.on_connected.set_result(True)
 
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Return the buffer the event loop receives into."""
+        return self._recv_buffer
+
+    def buffer_updated(self, nbytes: int) -> None:
+        """Called when nbytes have been received into the buffer."""
+        self.data_received(self._recv_buffer[:nbytes])
+
     def data_received(self, data: bytes) -> None:
         """Called when data is received."""
         try:
@@ -470,12 +646,35 @@ class TuyaProtocol(asyncio.Protocol):
         except Exception as e:
             self._logger.warning("Exception in data_received: %s", e)
 
+    def _write(self, data: bytes) -> None:
+        """Write data to the transport, along with any held-back frame."""
+        if self._pending_write is not None:
+            data = self._pending_write + data
+            self._pending_write = None
+        self.transport.write(data)
+
+    def _flush_pending_write(self) -> None:
+        """Send a held-back frame on its own when no command write follows.
+
+        The only held-back frame is SESS_KEY_NEG_FINISH. If it cannot be
+        sent, the device never accepts the session key, so it is dropped too.
+        """
+        if self._pending_write is None:
+            return
+        if self.transport:
+            self.transport.write(self._pending_write)
+        else:
+            self.session_key = None
+            self.dispatcher.session_key = None
+        self._pending_write = None
+
     def connection_lost(self, exc: Optional[Exception]) -> None:
         """Called when connection is lost."""
         self._logger.info("TCP connection lost: %s", exc)
         self.debug("Connection lost: %s", exc)
         self.session_key = None
         self.dispatcher.session_key = None
+        self._pending_write = None
 
         listener = self.listener()
         if listener:
@@ -512,6 +711,7 @@ class TuyaProtocol(asyncio.Protocol):
         # Clear session key
         self.session_key = None
         self.dispatcher.session_key = None
+        self._pending_write = None
 
     def start_heartbeat(self) -> None:
         """Start heartbeat loop."""
@@ -603,13 +803,14 @@ class TuyaProtocol(asyncio.Protocol):
                 if not self.dps_cache:
                     await self.detect_available_dps()
                 if self.dps_cache:
-                    dps = [int(dp) for dp in self.dps_cache if int(dp) in UPDATE_DPS_WHITELIST]
+                    whitelist = _UPDATE_DPS_WHITELIST_KEYS
+                    dps = [whitelist[dp] for dp in self.dps_cache if dp in whitelist]
 
         if dps:
             payload = self._generate_payload(CMD_UPDATE_DPS, dps)
             data = self._encode_message(payload)
             if self.transport:
-                self.transport.write(data)
+                self._write(data)
 
             # Some devices don't send status update after CMD_UPDATE_DPS
             # For devices with poll_dps configured, explicitly query status to get values
@@ -637,23 +838,22 @@ class TuyaProtocol(asyncio.Protocol):
     async def detect_available_dps(self, retry_count: int = 3) -> Dict[str, Any]:
         """Detect available data points by querying ranges."""
         self.dps_cache = {}
-        ranges = [(2, 11), (11, 21), (21, 31), (100, 111)]
 
-        # Wake device with heartbeat
-        for attempt in range(retry_count):
-            try:
-                await self.heartbeat()
-                await asyncio.sleep(0.5)
-                break
-            except Exception as e:
-                self.debug("Heartbeat attempt %d failed: %s", attempt + 1, e)
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(1)
+        # Wake device with heartbeat, unless it answered one moments ago
+        since_heartbeat = asyncio.get_running_loop().time() - self._last_heartbeat
+        if since_heartbeat > HEARTBEAT_INTERVAL / 2:
+            for attempt in range(retry_count):
+                try:
+                    await self.heartbeat()
+                    await asyncio.sleep(0.5)
+                    break
+                except Exception as e:
+                    self.debug("Heartbeat attempt %d failed: %s", attempt + 1, e)
+                    if attempt < retry_count - 1:
+                        await asyncio.sleep(1)
 
-        for dps_range in ranges:
-            self.dps_to_request = {"1": None}
-            for i in range(*dps_range):
-                self.dps_to_request[str(i)] = None
+        for dps_range, dps_keys in _DETECT_DPS_RANGES:
+            self.dps_to_request = dict.fromkeys(dps_keys)
 
             for attempt in range(retry_count):
                 try:
@@ -705,7 +905,7 @@ class TuyaProtocol(asyncio.Protocol):
         # Negotiate session key for 3.4+ if needed (skip if permanently disabled — #30)
         if self.protocol_version >= 3.4 and self.session_key is None and not self._sess_key_disabled:
             # Backoff: skip negotiation if we failed recently (avoid retry storm)
-            now = asyncio.get_event_loop().time()
+            now = asyncio.get_running_loop().time()
             last_fail = self._sess_key_last_fail
             fail_count = self._sess_key_fail_count
             backoff = min(30 * (2 ** min(fail_count, 5)), 600)  # 30s, 60s, 120s... max 600s
@@ -730,11 +930,17 @@ class TuyaProtocol(asyncio.Protocol):
 
         self.debug("Sending command %d (device_type=%s)", command, self.device_type)
 
-        # Generate and encode payload
-        payload = self._generate_payload(command, dps)
-        data = self._encode_message(payload)
+        # Generate and encode payload. A NEG_FINISH held back for this
+        # command goes out on its own if the command itself cannot.
+        try:
+            payload = self._generate_payload(command, dps)
+            data = self._encode_message(payload)
+        except Exception:
+            self._flush_pending_write()
+            raise
 
         if not self.transport:
+            self._flush_pending_write()
             self._logger.error("No transport available")
             return None
 
@@ -747,7 +953,7 @@ class TuyaProtocol(asyncio.Protocol):
             wait_seqno = self.seqno - 1  # seqno was incremented in _encode_message
 
         # Send and wait
-        self.transport.write(data)
+        self._write(data)
         try:
             msg = await self.dispatcher.wait_for(wait_seqno, payload.cmd)
         except asyncio.TimeoutError:
@@ -761,6 +967,7 @@ class TuyaProtocol(asyncio.Protocol):
         # Protocol 3.5 devices may return non-empty encrypted payload that fails JSON decode
         if payload.cmd == CMD_HEART_BEAT:
             if msg.retcode == 0 or len(msg.payload) == 0:
+                self._last_heartbeat = asyncio.get_running_loop().time()
                 self.debug("Heartbeat ACK received (retcode=%d, payload_len=%d)", msg.retcode, len(msg.payload))
                 return None
             else:
@@ -795,11 +1002,12 @@ class TuyaProtocol(asyncio.Protocol):
             payload=payload,
             key=key,
             protocol_version=self.protocol_version,
-            encrypt=True
+            encrypt=True,
+            cipher=self.dispatcher.cipher(key)
         )
         self.seqno += 1
 
-        self.transport.write(data)
+        self._write(data)
 
         while recv_retries > 0:
             try:
@@ -883,7 +1091,7 @@ class TuyaProtocol(asyncio.Protocol):
         # For Protocol 3.4 with 55AA format, we need to decrypt with ECB
         if self.protocol_version < 3.5 or response.prefix != PREFIX_6699:
             try:
-                cipher = AESCipher(self.device_key)
+                cipher = self.dispatcher.cipher(self.device_key)
                 payload = cipher.decrypt_ecb(payload, unpad=True)
             except Exception as e:
                 self.debug("Failed to decrypt SESS_KEY_NEG_RESP: %s", e)
@@ -902,30 +1110,25 @@ class TuyaProtocol(asyncio.Protocol):
         received_hmac = payload[16:48]
 
         # Verify HMAC of our local nonce
-        expected_hmac = hmac.new(self.device_key, self.local_nonce, sha256).digest()
+        expected_hmac = calculate_hmac_sha256(self.device_key, self.local_nonce)
         if not hmac.compare_digest(expected_hmac, received_hmac):
             self.debug("HMAC verification failed (may be ok for some devices)")
             # Continue anyway - some devices don't implement HMAC correctly
 
         # Calculate session key
-        # XOR nonces
-        xor_result = bytes(a ^ b for a, b in zip(self.local_nonce, self.remote_nonce))
-        self.debug("Nonce XOR: %s", xor_result.hex())
+        # XOR nonces (as one big-int XOR rather than a per-byte loop)
+        xor_result = (
+            int.from_bytes(self.local_nonce, "big") ^ int.from_bytes(self.remote_nonce, "big")
+        ).to_bytes(len(self.local_nonce), "big")
+        if self.enable_debug and self._logger.isEnabledFor(_DEBUG):
+            self.debug("Nonce XOR: %s", xor_result.hex())
 
         if self.protocol_version >= 3.5:
             # Protocol 3.5: AES-GCM encrypt, take ciphertext only
             # IV = first 12 bytes of local_nonce
-            from cryptography.hazmat.backends import default_backend
-            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
             iv = self.local_nonce[:12]
-            gcm_cipher = Cipher(
-                algorithms.AES(self.device_key),
-                modes.GCM(iv),
-                backend=default_backend()
-            )
-            encryptor = gcm_cipher.encryptor()
-            encrypted = encryptor.update(xor_result) + encryptor.finalize()
+            cipher = self.dispatcher.cipher(self.device_key)
+            encrypted, _ = cipher.encrypt_gcm(xor_result, iv)
             session_key = encrypted[:16]
 
             # TinyTuya quirk: if first byte is 0x00, negotiation should be retried
@@ -934,19 +1137,21 @@ class TuyaProtocol(asyncio.Protocol):
                 # Don't fail, but log warning
         else:
             # Protocol 3.4: AES-ECB encrypt
-            cipher = AESCipher(self.device_key)
+            cipher = self.dispatcher.cipher(self.device_key)
             encrypted = cipher.encrypt_ecb(xor_result, pad=False)
             session_key = encrypted[:16]
 
-        self.debug("Session key: %s", session_key.hex())
+        if self.enable_debug and self._logger.isEnabledFor(_DEBUG):
+            self.debug("Session key: %s", session_key.hex())
 
         # Step 3: Send HMAC of remote nonce
-        response_hmac = hmac.new(self.device_key, self.remote_nonce, sha256).digest()
+        response_hmac = calculate_hmac_sha256(self.device_key, self.remote_nonce)
         # Odeslat CMD_SESS_KEY_NEG_FINISH bez čekání na odpověď
-        data = pack_message(seqno=self.seqno, cmd=CMD_SESS_KEY_NEG_FINISH, payload=response_hmac, key=self.device_key, protocol_version=self.protocol_version, encrypt=True)
-        self.transport.write(data)
+        # Nothing waits on it, so it is held back and goes out in the same
+        # write as the command that triggered negotiation
+        self._pending_write = pack_message(seqno=self.seqno, cmd=CMD_SESS_KEY_NEG_FINISH, payload=response_hmac, key=self.device_key, protocol_version=self.protocol_version, encrypt=True, cipher=self.dispatcher.cipher(self.device_key))
         self.seqno += 1
-        self.debug("Sent SESS_KEY_NEG_FINISH, not waiting for response")
+        self.debug("Queued SESS_KEY_NEG_FINISH, not waiting for response")
 
         # Store session key
         self.session_key = session_key
@@ -962,46 +1167,32 @@ class TuyaProtocol(asyncio.Protocol):
     def _encode_message(self, msg: MessagePayload) -> bytes:
         """Encode message for sending."""
         payload = msg.payload
+        version = self.protocol_version
 
         # Get encryption key
         key = self.session_key if self.session_key else self.device_key
+        cipher = self.dispatcher.cipher(key)
 
-        # Add version header for certain commands and protocols
-        if msg.cmd not in NO_PROTOCOL_HEADER_CMDS:
-            if self.protocol_version >= 3.5:
-                version_header = VERSION_35 + PROTOCOL_3X_HEADER_PAD
-                payload = version_header + payload
-            elif self.protocol_version >= 3.4:
-                version_header = VERSION_34 + PROTOCOL_3X_HEADER_PAD
-                payload = version_header + payload
-            elif self.protocol_version >= 3.3:
-                version_header = VERSION_33 + PROTOCOL_3X_HEADER_PAD
-                payload = version_header + payload
+        # Version header for this command (empty where none is sent)
+        version_header = self._command_headers.get(msg.cmd, self._version_header)
 
         # For Protocol 3.1-3.4, encrypt payload here
         # For Protocol 3.5, encryption happens in pack_message (GCM)
-        if self.protocol_version < 3.5:
-            if self.protocol_version >= 3.4:
+        if version >= 3.4:
+            # v3.4+: header goes inside the encrypted payload
+            payload = version_header + payload
+            if version < 3.5:
                 # v3.4: encrypt everything
-                cipher = AESCipher(key)
                 payload = cipher.encrypt_ecb(payload, pad=True)
-            elif self.protocol_version >= 3.2:
-                # v3.2-3.3: encrypt payload, add header after
-                cipher = AESCipher(key)
-                encrypted_payload = cipher.encrypt_ecb(msg.payload, pad=True)
-                if msg.cmd not in NO_PROTOCOL_HEADER_CMDS:
-                    version_header = VERSION_33 + PROTOCOL_3X_HEADER_PAD
-                    payload = version_header + encrypted_payload
-                else:
-                    payload = encrypted_payload
-            elif msg.cmd == CMD_CONTROL:
-                # v3.1: only encrypt CONTROL commands with MD5 prefix
-                cipher = AESCipher(key)
-                encrypted = cipher.encrypt_ecb_base64(msg.payload, pad=True)
-                from hashlib import md5
-                pre_md5 = b"data=" + encrypted + b"||lpv=" + VERSION_31 + b"||" + key
-                md5_hash = md5(pre_md5).hexdigest()
-                payload = VERSION_31 + md5_hash[8:24].encode("latin1") + encrypted
+        elif version >= 3.2:
+            # v3.2-3.3: encrypt payload; pack_message writes the header in front
+            payload = cipher.encrypt_ecb(payload, pad=True)
+        elif msg.cmd == CMD_CONTROL:
+            # v3.1: only encrypt CONTROL commands with MD5 prefix
+            encrypted = cipher.encrypt_ecb_base64(payload, pad=True)
+            pre_md5 = b"".join((b"data=", encrypted, b"||lpv=", VERSION_31, b"||", key))
+            md5_hash = md5(pre_md5).hexdigest()
+            payload = b"".join((VERSION_31, md5_hash[8:24].encode("latin1"), encrypted))
 
         # Pack message
         seqno = self.seqno
@@ -1012,8 +1203,10 @@ class TuyaProtocol(asyncio.Protocol):
             cmd=msg.cmd,
             payload=payload,
             key=key,
-            protocol_version=self.protocol_version,
-            encrypt=(self.protocol_version >= 3.5)  # GCM encryption in pack_message
+            protocol_version=version,
+            encrypt=(version >= 3.5),  # GCM encryption in pack_message
+            cipher=cipher,
+            version_header=version_header if 3.2 <= version < 3.4 else b""
         )
 
     def _decode_payload(self, payload: bytes) -> Optional[Dict]:
@@ -1023,7 +1216,7 @@ class TuyaProtocol(asyncio.Protocol):
         # Protocol 3.4: payload is encrypted
         if self.protocol_version == 3.4:
             try:
-                cipher = AESCipher(key)
+                cipher = self.dispatcher.cipher(key)
                 payload = cipher.decrypt_ecb(payload, unpad=True)
             except Exception as e:
                 self.debug("Failed to decrypt v3.4 payload: %s", e)
@@ -1034,7 +1227,7 @@ class TuyaProtocol(asyncio.Protocol):
         if payload.startswith(VERSION_31):
             # v3.1 encrypted format
             payload = payload[len(VERSION_31):]
-            cipher = AESCipher(key)
+            cipher = self.dispatcher.cipher(key)
             payload = cipher.decrypt_ecb_base64(payload[16:], unpad=True)
         elif payload.startswith(version_bytes):
             # v3.x header present
@@ -1043,31 +1236,29 @@ class TuyaProtocol(asyncio.Protocol):
         # v3.2/3.3: decrypt if not already done
         if self.protocol_version in (3.2, 3.3) and not payload.startswith(b"{"):
             try:
-                cipher = AESCipher(key)
+                cipher = self.dispatcher.cipher(key)
                 payload = cipher.decrypt_ecb(payload, unpad=True)
             except Exception as e:
                 self.debug("Failed to decrypt v3.x payload: %s", e)
                 return self._error_json(ERR_PAYLOAD)
 
-        # Decode to string
-        if isinstance(payload, bytes):
-            try:
-                payload = payload.decode("utf-8")
-            except UnicodeDecodeError:
-                self.debug("Failed to decode payload as UTF-8")
-                return self._error_json(ERR_PAYLOAD)
-
         # Check for "data unvalid" error (type_0d device)
-        if "data unvalid" in payload:
+        if b"data unvalid" in payload:
             self.device_type = DEVICE_TYPE_0D
             self.debug("Detected type_0d device")
             return None
 
-        # Parse JSON with defensive error handling
+        # Parse JSON straight from bytes; the payload is only decoded to
+        # text when parsing fails, to tell bad UTF-8 from bad JSON
         self.debug("Decoded payload: %s", payload)
         try:
-            json_payload = json.loads(payload)
-        except json.JSONDecodeError as e:
+            json_payload = json_loads(payload)
+        except ValueError as e:
+            try:
+                payload = payload.decode("utf-8")
+            except UnicodeDecodeError:
+                self.debug("Failed to decode payload as UTF-8")
+                return self._error_json(ERR_PAYLOAD)
             # Log more details for debugging, return error structure instead of raising
             payload_preview = payload[:100] if len(payload) > 100 else payload
             self.debug("Failed to parse JSON: %s (payload=%r)", e, payload_preview)
@@ -1080,8 +1271,16 @@ class TuyaProtocol(asyncio.Protocol):
 
         return json_payload
 
-    def _generate_payload(self, command: int, data: Optional[Dict] = None) -> MessagePayload:
-        """Generate command payload."""
+    def _payload_template(self, command: int) -> "_PayloadTemplate":
+        """Return the cached payload template for a command.
+
+        Templates depend only on device type, command and device ID; the
+        cache is rebuilt whenever the device type changes.
+        """
+        cached = self._payload_templates.get(command)
+        if cached is not None:
+            return cached
+
         json_data = None
         command_override = None
 
@@ -1110,33 +1309,69 @@ class TuyaProtocol(asyncio.Protocol):
             json_data["devId"] = self.device_id
         if "uid" in json_data:
             json_data["uid"] = self.device_id
+
+        # Timestamp is filled in per message
+        timestamp = None
         if "t" in json_data:
-            if json_data["t"] == "int":
-                json_data["t"] = int(time.time())
-            else:
-                json_data["t"] = str(int(time.time()))
+            timestamp = _timestamp_int if json_data["t"] == "int" else _timestamp_str
+
+        # Where data points go when the caller passes some
+        if "dpId" in json_data:
+            data_key = "dpId"
+        elif "data" in json_data:
+            data_key = "data"
+        else:
+            data_key = "dps"
+
+        # type_0d devices are queried with an explicit list of DPS
+        request_dps = self.device_type == DEVICE_TYPE_0D and command == CMD_DP_QUERY
+
+        cmd = command_override if command_override else command
+
+        # Payloads without a timestamp (e.g. heartbeat) never change, so
+        # one message is built here and handed out for every send
+        static_message = None
+        if timestamp is None and not request_dps:
+            static_message = MessagePayload(cmd=cmd, payload=json_dumps(json_data))
+
+        cached = _PayloadTemplate(
+            json_data=json_data,
+            timestamp=timestamp,
+            cmd=cmd,
+            data_key=data_key,
+            request_dps=request_dps,
+            message=static_message,
+        )
+        self._payload_templates[command] = cached
+        return cached
+
+    def _generate_payload(self, command: int, data: Optional[Dict] = None) -> MessagePayload:
+        """Generate command payload."""
+        template = self._payload_template(command)
+
+        if data is None and template.message is not None:
+            self.debug("Payload: %s", template.message.payload)
+            return template.message
+
+        json_data = template.json_data.copy()
+        if template.timestamp is not None:
+            json_data["t"] = template.timestamp()
 
         # Add data points
         if data is not None:
-            if "dpId" in json_data:
-                json_data["dpId"] = data
-            elif "data" in json_data:
+            if template.data_key == "data":
                 json_data["data"] = {"dps": data}
             else:
-                json_data["dps"] = data
-        elif self.device_type == DEVICE_TYPE_0D and command == CMD_DP_QUERY:
+                json_data[template.data_key] = data
+        elif template.request_dps:
             json_data["dps"] = self.dps_to_request
 
         # Convert to JSON bytes
-        payload_str = json.dumps(json_data, separators=(",", ":"))
-        payload = payload_str.encode("utf-8")
+        payload = json_dumps(json_data)
 
-        self.debug("Payload: %s", payload_str)
+        self.debug("Payload: %s", payload)
 
-        return MessagePayload(
-            cmd=command_override if command_override else command,
-            payload=payload
-        )
+        return MessagePayload(cmd=template.cmd, payload=payload)
 
     def _error_json(self, code: int) -> Dict:
         """Generate error response."""
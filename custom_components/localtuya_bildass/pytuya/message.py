@@ -3,16 +3,18 @@
 Tuya Message structures.
 
 Defines data structures for Tuya protocol messages.
+
+TuyaHeader and TuyaMessage are built for every received frame, so they are
+NamedTuples (C-level construction) rather than dataclasses.
 """
 
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from .constants import PREFIX_55AA
 
 
-@dataclass
-class TuyaHeader:
+class TuyaHeader(NamedTuple):
     """Parsed message header.
 
     Attributes:
@@ -29,8 +31,7 @@ class TuyaHeader:
     total_length: int
 
 
-@dataclass
-class TuyaMessage:
+class TuyaMessage(NamedTuple):
     """Complete Tuya message.
 
     Attributes:
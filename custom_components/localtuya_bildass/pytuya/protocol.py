@@ -24,21 +24,21 @@ Message formats:
 import binascii
 import hmac
 import os
-import struct
 import logging
-from hashlib import sha256
+import zlib
+from functools import lru_cache
 from typing import Optional, Tuple
 
 from .cipher import AESCipher
 from .constants import (
     PREFIX_55AA, PREFIX_55AA_BIN, SUFFIX_55AA, SUFFIX_55AA_BIN,
     PREFIX_6699, PREFIX_6699_BIN, SUFFIX_6699, SUFFIX_6699_BIN,
-    HEADER_FMT_55AA, HEADER_SIZE_55AA,
-    HEADER_FMT_6699, HEADER_SIZE_6699,
-    RETCODE_FMT, RETCODE_SIZE,
-    FOOTER_FMT_55AA_CRC, FOOTER_SIZE_55AA_CRC,
-    FOOTER_FMT_55AA_HMAC, FOOTER_SIZE_55AA_HMAC,
-    FOOTER_FMT_6699, FOOTER_SIZE_6699,
+    HEADER_STRUCT_55AA, HEADER_SIZE_55AA,
+    HEADER_STRUCT_6699, HEADER_SIZE_6699,
+    RETCODE_SIZE,
+    FOOTER_STRUCT_55AA_CRC, FOOTER_SIZE_55AA_CRC,
+    FOOTER_STRUCT_55AA_HMAC, FOOTER_SIZE_55AA_HMAC,
+    FOOTER_SIZE_6699, UINT32_BE,
     GCM_NONCE_SIZE, GCM_TAG_SIZE,
     MAX_PAYLOAD_SIZE, SESSION_KEY_CMDS,
 )
@@ -46,16 +46,49 @@ from .message import TuyaHeader, TuyaMessage, DecodeError
 
 _LOGGER = logging.getLogger(__name__)
 
+# Retcode 0 as it appears at the start of a decrypted 6699 payload
+_ZERO_RETCODE = bytes(RETCODE_SIZE)
+
+# GCM only needs nonces to be unique per key, so outgoing 6699 frames use a
+# random per-process prefix plus a counter instead of a getrandom() syscall
+# per frame. Not safe to share across forked processes.
+_NONCE_PREFIX = os.urandom(GCM_NONCE_SIZE - 4)
+_nonce_counter = 0
+
+
+def _next_gcm_nonce() -> bytes:
+    """Return a fresh 12-byte GCM nonce."""
+    global _NONCE_PREFIX, _nonce_counter
+    if _nonce_counter > 0xFFFFFFFF:
+        # Counter exhausted: start over under a new random prefix
+        _NONCE_PREFIX = os.urandom(GCM_NONCE_SIZE - 4)
+        _nonce_counter = 0
+    nonce = _NONCE_PREFIX + _nonce_counter.to_bytes(4, "big")
+    _nonce_counter += 1
+    return nonce
+
+
+@lru_cache(maxsize=64)
+def _get_cipher(key: bytes) -> AESCipher:
+    """Return a shared cipher for key, for callers that don't bring their own.
+
+    Discovery and one-off pack/unpack calls reuse the same few keys, so the
+    AES key schedule is set up once per key instead of once per message.
+    """
+    return AESCipher(key)
+
 
 # =============================================================================
 # HEADER PARSING
 # =============================================================================
 
-def parse_header(data: bytes) -> TuyaHeader:
+def parse_header(data: bytes, offset: int = 0) -> TuyaHeader:
     """Parse message header to determine format and length.
 
     Args:
         data: Raw message bytes (at least header size needed)
+        offset: Position of the frame in data, so a receive buffer can be
+            parsed in place without slicing out each header
 
     Returns:
         TuyaHeader with parsed values
@@ -63,25 +96,34 @@ def parse_header(data: bytes) -> TuyaHeader:
     Raises:
         DecodeError: If header is invalid or not enough data
     """
-    if len(data) < 4:
+    available = len(data) - offset
+    if available < 4:
         raise DecodeError("Not enough data to parse header prefix")
 
-    # Determine format by prefix
-    if data[:4] == PREFIX_6699_BIN:
-        return _parse_header_6699(data)
-    elif data[:4] == PREFIX_55AA_BIN:
-        return _parse_header_55aa(data)
+    # Fast path: speculatively read a full 55AA header in one unpack
+    if available >= HEADER_SIZE_55AA:
+        prefix, seqno, cmd, length = HEADER_STRUCT_55AA.unpack_from(data, offset)
+        if prefix == PREFIX_55AA:
+            if length > MAX_PAYLOAD_SIZE:
+                raise DecodeError(f"Header claims packet size {length} > {MAX_PAYLOAD_SIZE} bytes")
+            return TuyaHeader(prefix, seqno, cmd, length, HEADER_SIZE_55AA + length)
+
+    # Determine format by prefix (startswith avoids slicing the buffer)
+    if data.startswith(PREFIX_55AA_BIN, offset):
+        return _parse_header_55aa(data, offset)
+    elif data.startswith(PREFIX_6699_BIN, offset):
+        return _parse_header_6699(data, offset)
     else:
-        prefix_hex = binascii.hexlify(data[:4]).decode()
+        prefix_hex = binascii.hexlify(data[offset:offset + 4]).decode()
         raise DecodeError(f"Unknown header prefix: {prefix_hex}")
 
 
-def _parse_header_55aa(data: bytes) -> TuyaHeader:
+def _parse_header_55aa(data: bytes, offset: int = 0) -> TuyaHeader:
     """Parse 55AA format header."""
-    if len(data) < HEADER_SIZE_55AA:
-        raise DecodeError(f"Not enough data for 55AA header: need {HEADER_SIZE_55AA}, got {len(data)}")
+    if len(data) - offset < HEADER_SIZE_55AA:
+        raise DecodeError(f"Not enough data for 55AA header: need {HEADER_SIZE_55AA}, got {len(data) - offset}")
 
-    prefix, seqno, cmd, length = struct.unpack(HEADER_FMT_55AA, data[:HEADER_SIZE_55AA])
+    prefix, seqno, cmd, length = HEADER_STRUCT_55AA.unpack_from(data, offset)
 
     # Sanity check
     if length > MAX_PAYLOAD_SIZE:
@@ -99,14 +141,12 @@ def _parse_header_55aa(data: bytes) -> TuyaHeader:
     )
 
 
-def _parse_header_6699(data: bytes) -> TuyaHeader:
+def _parse_header_6699(data: bytes, offset: int = 0) -> TuyaHeader:
     """Parse 6699 format header."""
-    if len(data) < HEADER_SIZE_6699:
-        raise DecodeError(f"Not enough data for 6699 header: need {HEADER_SIZE_6699}, got {len(data)}")
+    if len(data) - offset < HEADER_SIZE_6699:
+        raise DecodeError(f"Not enough data for 6699 header: need {HEADER_SIZE_6699}, got {len(data) - offset}")
 
-    prefix, version, reserved, seqno, cmd, length = struct.unpack(
-        HEADER_FMT_6699, data[:HEADER_SIZE_6699]
-    )
+    prefix, version, reserved, seqno, cmd, length = HEADER_STRUCT_6699.unpack_from(data, offset)
 
     # Sanity check
     if length > MAX_PAYLOAD_SIZE:
@@ -134,7 +174,9 @@ def pack_message(
     payload: bytes,
     key: bytes,
     protocol_version: float,
-    encrypt: bool = True
+    encrypt: bool = True,
+    cipher: Optional[AESCipher] = None,
+    version_header: bytes = b""
 ) -> bytes:
     """Pack a message for sending to device.
 
@@ -145,15 +187,18 @@ def pack_message(
         key: Encryption key (device key or session key)
         protocol_version: Protocol version (3.1, 3.3, 3.4, 3.5)
         encrypt: Whether to encrypt payload (default True)
+        cipher: Cipher for key, reused across calls (optional, built if not provided)
+        version_header: Plaintext header placed in front of the (encrypted)
+            payload, as Protocol 3.2-3.3 sends it (55AA format only)
 
     Returns:
         Packed message bytes ready to send
     """
     if protocol_version >= 3.5:
-        return _pack_message_6699(seqno, cmd, payload, key, encrypt)
+        return _pack_message_6699(seqno, cmd, payload, key, encrypt, cipher)
     else:
         use_hmac = protocol_version >= 3.4
-        return _pack_message_55aa(seqno, cmd, payload, key, encrypt, use_hmac)
+        return _pack_message_55aa(seqno, cmd, payload, key, encrypt, use_hmac, cipher, version_header)
 
 
 def _pack_message_55aa(
@@ -162,39 +207,46 @@ def _pack_message_55aa(
     payload: bytes,
     key: bytes,
     encrypt: bool,
-    use_hmac: bool
+    use_hmac: bool,
+    cipher: Optional[AESCipher] = None,
+    version_header: bytes = b""
 ) -> bytes:
     """Pack message in 55AA format (Protocol 3.1-3.4).
 
-    Structure: [header 16B] [payload] [crc/hmac] [suffix 4B]
-    Length field = len(payload) + len(crc/hmac) + len(suffix)
+    Structure: [header 16B] [version header] [payload] [crc/hmac] [suffix 4B]
+    Length field = len(version header + payload) + len(crc/hmac) + len(suffix)
     """
-    cipher = AESCipher(key)
-
-    # Encrypt payload if needed
+    # Encrypt payload if needed. TuyaProtocol encrypts 3.1-3.4 payloads
+    # itself, so only build a cipher when this call actually encrypts.
     if encrypt and payload:
-        payload = cipher.encrypt_ecb(payload, pad=True)
+        payload = (cipher or _get_cipher(key)).encrypt_ecb(payload, pad=True)
 
     # Calculate footer size
     footer_size = FOOTER_SIZE_55AA_HMAC if use_hmac else FOOTER_SIZE_55AA_CRC
 
     # Length = payload + footer (includes suffix)
-    length = len(payload) + footer_size
+    payload_start = HEADER_SIZE_55AA + len(version_header)
+    payload_end = payload_start + len(payload)
+    length = payload_end - HEADER_SIZE_55AA + footer_size
 
-    # Build header
-    header = struct.pack(HEADER_FMT_55AA, PREFIX_55AA, seqno, cmd, length)
+    # Assemble header, payload and footer in place in one buffer
+    buf = bytearray(payload_end + footer_size)
+    HEADER_STRUCT_55AA.pack_into(buf, 0, PREFIX_55AA, seqno, cmd, length)
+    buf[HEADER_SIZE_55AA:payload_start] = version_header
+    buf[payload_start:payload_end] = payload
 
     # Calculate CRC/HMAC over header + payload
-    data_to_sign = header + payload
+    data_to_sign = memoryview(buf)[:payload_end]
 
     if use_hmac:
-        signature = hmac.new(key, data_to_sign, sha256).digest()
-        footer = struct.pack(FOOTER_FMT_55AA_HMAC, signature, SUFFIX_55AA)
+        signature = calculate_hmac_sha256(key, data_to_sign)
+        FOOTER_STRUCT_55AA_HMAC.pack_into(buf, payload_end, signature, SUFFIX_55AA)
     else:
-        crc = binascii.crc32(data_to_sign) & 0xFFFFFFFF
-        footer = struct.pack(FOOTER_FMT_55AA_CRC, crc, SUFFIX_55AA)
+        crc = zlib.crc32(data_to_sign)
+        FOOTER_STRUCT_55AA_CRC.pack_into(buf, payload_end, crc, SUFFIX_55AA)
+    data_to_sign.release()
 
-    return header + payload + footer
+    return bytes(buf)
 
 
 def _pack_message_6699(
@@ -202,7 +254,8 @@ def _pack_message_6699(
     cmd: int,
     payload: bytes,
     key: bytes,
-    encrypt: bool
+    encrypt: bool,
+    cipher: Optional[AESCipher] = None
 ) -> bytes:
     """Pack message in 6699 format (Protocol 3.5).
 
@@ -210,16 +263,19 @@ def _pack_message_6699(
     Length field = len(nonce) + len(encrypted_payload) + len(tag) = payload_len + 28
     AAD = header bytes 4-18 (version, reserved, seqno, cmd, length)
     """
-    # Generate random nonce
-    nonce = os.urandom(GCM_NONCE_SIZE)
+    nonce = _next_gcm_nonce()
 
     # Build header first (we need AAD)
     # Length = nonce(12) + encrypted_payload + tag(16)
     payload_len = len(payload)
     length = GCM_NONCE_SIZE + payload_len + GCM_TAG_SIZE
 
-    header = struct.pack(
-        HEADER_FMT_6699,
+    # Assemble header, nonce, ciphertext and footer in place in one buffer
+    payload_start = HEADER_SIZE_6699 + GCM_NONCE_SIZE
+    payload_end = payload_start + payload_len
+    buf = bytearray(payload_end + FOOTER_SIZE_6699)
+    HEADER_STRUCT_6699.pack_into(
+        buf, 0,
         PREFIX_6699,
         0x00,  # version
         0x00,  # reserved
@@ -227,22 +283,23 @@ def _pack_message_6699(
         cmd,
         length
     )
+    buf[HEADER_SIZE_6699:payload_start] = nonce
 
     # AAD is header without prefix (bytes 4-18)
-    aad = header[4:]
+    view = memoryview(buf)
+    aad = view[4:HEADER_SIZE_6699]
 
-    # Encrypt payload with GCM
-    cipher = AESCipher(key)
-    if encrypt and payload:
-        ciphertext, tag = cipher.encrypt_gcm(payload, nonce, aad)
-    else:
-        # Even "unencrypted" 6699 needs GCM format
-        ciphertext, tag = cipher.encrypt_gcm(payload, nonce, aad)
+    # Encrypt payload with GCM straight into the frame buffer, ciphertext
+    # and tag together (even "unencrypted" 6699 messages need the GCM format)
+    if cipher is None:
+        cipher = _get_cipher(key)
+    tag_end = payload_end + GCM_TAG_SIZE
+    cipher.encrypt_gcm_into(payload, nonce, aad, view[payload_start:tag_end])
 
     # Build footer
-    footer = struct.pack(FOOTER_FMT_6699, tag, SUFFIX_6699)
+    UINT32_BE.pack_into(buf, tag_end, SUFFIX_6699)
 
-    return header + nonce + ciphertext + footer
+    return bytes(buf)
 
 
 # =============================================================================
@@ -254,7 +311,8 @@ def unpack_message(
     key: bytes,
     protocol_version: float,
     header: Optional[TuyaHeader] = None,
-    no_retcode: bool = False
+    no_retcode: bool = False,
+    cipher: Optional[AESCipher] = None
 ) -> TuyaMessage:
     """Unpack received message.
 
@@ -262,8 +320,10 @@ def unpack_message(
         data: Raw message bytes
         key: Decryption key (device key or session key)
         protocol_version: Protocol version
-        header: Pre-parsed header (optional, will parse if not provided)
+        header: Pre-parsed header; pass it when the caller already parsed
+            the frame (as the receive loop does) so it isn't parsed twice
         no_retcode: Skip retcode parsing (for some message types)
+        cipher: Cipher for key, reused across calls (optional, built if not provided)
 
     Returns:
         TuyaMessage with decrypted payload
@@ -275,7 +335,7 @@ def unpack_message(
         header = parse_header(data)
 
     if header.prefix == PREFIX_6699:
-        return _unpack_message_6699(data, key, header)
+        return _unpack_message_6699(data, key, header, cipher)
     else:
         use_hmac = protocol_version >= 3.4
         return _unpack_message_55aa(data, key, header, use_hmac, no_retcode)
@@ -302,55 +362,54 @@ def _unpack_message_55aa(
     retcode = 0
 
     if not no_retcode:
-        if len(data) >= payload_start + RETCODE_SIZE:
-            # Check if this looks like a retcode (usually 0 or small number)
-            potential_retcode = struct.unpack(
-                RETCODE_FMT,
-                data[payload_start:payload_start + RETCODE_SIZE]
-            )[0]
-            # Retcode is usually present in device responses
-            if potential_retcode < 100:  # Reasonable retcode range
-                retcode = potential_retcode
-                payload_start += RETCODE_SIZE
+        # Retcode is usually present in device responses and is 0 or a small
+        # number (< 100), i.e. its top three bytes are zero. Test those bytes
+        # directly: a payload without retcode starts with data (e.g. "{" or
+        # "3.x") and fails on the first byte.
+        if (
+            len(data) >= payload_start + RETCODE_SIZE
+            and not data[payload_start]
+            and not data[payload_start + 1]
+            and not data[payload_start + 2]
+            and data[payload_start + 3] < 100
+        ):
+            retcode = data[payload_start + 3]
+            payload_start += RETCODE_SIZE
 
     # Extract payload (everything between header/retcode and footer)
     payload_end = HEADER_SIZE_55AA + header.length - footer_size
     payload = data[payload_start:payload_end]
 
-    # Extract and verify footer
+    # Extract and verify footer; the signed region is read through a
+    # memoryview so it isn't copied just to be hashed
     footer_start = payload_end
-    footer_data = data[footer_start:footer_start + footer_size]
+    signed = memoryview(data)[:footer_start]
 
     crc_good = True
     if use_hmac:
-        received_hmac, suffix = struct.unpack(FOOTER_FMT_55AA_HMAC, footer_data)
-        expected_hmac = hmac.new(key, data[:footer_start], sha256).digest()
+        received_hmac, suffix = FOOTER_STRUCT_55AA_HMAC.unpack_from(data, footer_start)
+        expected_hmac = calculate_hmac_sha256(key, signed)
         crc_good = hmac.compare_digest(expected_hmac, received_hmac)
         if suffix != SUFFIX_55AA:
             _LOGGER.debug("55AA suffix mismatch: got %08X", suffix)
     else:
-        received_crc, suffix = struct.unpack(FOOTER_FMT_55AA_CRC, footer_data)
-        expected_crc = binascii.crc32(data[:footer_start]) & 0xFFFFFFFF
+        received_crc, suffix = FOOTER_STRUCT_55AA_CRC.unpack_from(data, footer_start)
+        expected_crc = zlib.crc32(signed)
         crc_good = (expected_crc == received_crc)
         if suffix != SUFFIX_55AA:
             _LOGGER.debug("55AA suffix mismatch: got %08X", suffix)
 
+    # Positional, in field order: skips building a kwargs dict per frame
     return TuyaMessage(
-        seqno=header.seqno,
-        cmd=header.cmd,
-        payload=payload,
-        retcode=retcode,
-        crc_good=crc_good,
-        prefix=header.prefix,
-        nonce=None,
-        tag=None
+        header.seqno, header.cmd, payload, retcode, crc_good, header.prefix
     )
 
 
 def _unpack_message_6699(
     data: bytes,
     key: bytes,
-    header: TuyaHeader
+    header: TuyaHeader,
+    cipher: Optional[AESCipher]
 ) -> TuyaMessage:
     """Unpack 6699 format message (Protocol 3.5).
 
@@ -369,7 +428,7 @@ def _unpack_message_6699(
     # Extract encrypted payload (between nonce and tag)
     payload_start = nonce_start + GCM_NONCE_SIZE
     payload_end = HEADER_SIZE_6699 + header.length - GCM_TAG_SIZE
-    ciphertext = data[payload_start:payload_end]
+    ciphertext = memoryview(data)[payload_start:payload_end]
 
     # Extract tag (16 bytes before suffix)
     tag_start = payload_end
@@ -377,7 +436,7 @@ def _unpack_message_6699(
 
     # Extract suffix
     suffix_start = tag_start + GCM_TAG_SIZE
-    suffix = struct.unpack(">I", data[suffix_start:suffix_start + 4])[0]
+    suffix = UINT32_BE.unpack_from(data, suffix_start)[0]
     if suffix != SUFFIX_6699:
         _LOGGER.debug("6699 suffix mismatch: got %08X, expected %08X", suffix, SUFFIX_6699)
 
@@ -385,50 +444,49 @@ def _unpack_message_6699(
     aad = data[4:HEADER_SIZE_6699]
 
     # Decrypt with GCM
-    cipher = AESCipher(key)
+    if cipher is None:
+        cipher = _get_cipher(key)
     crc_good = True
     payload = b""
 
-    # Try GCM with AAD first
-    try:
-        payload = cipher.decrypt_gcm(ciphertext, nonce, tag, aad)
-    except Exception as e1:
-        _LOGGER.debug("GCM decrypt with AAD failed: %s", e1)
-        # Try without AAD
+    # Authenticated attempts, starting with whichever worked last for this
+    # cipher. Devices are consistent, so after one success the other attempt
+    # (and its exception) is skipped.
+    attempts = (None, aad) if cipher.gcm_no_aad else (aad, None)
+    for attempt_aad in attempts:
+        try:
+            payload = cipher.decrypt_gcm(ciphertext, nonce, tag, attempt_aad)
+        except Exception as ex:
+            _LOGGER.debug(
+                "GCM decrypt %s AAD failed: %s",
+                "with" if attempt_aad else "without", ex
+            )
+            continue
+        cipher.gcm_no_aad = attempt_aad is None
+        break
+    else:
+        # Last resort: CTR mode (no authentication, never remembered)
         try:
-            payload = cipher.decrypt_gcm(ciphertext, nonce, tag, None)
-        except Exception as e2:
-            _LOGGER.debug("GCM decrypt without AAD failed: %s", e2)
-            # Last resort: CTR mode (no authentication)
-            try:
-                payload = cipher.decrypt_gcm_noauth(ciphertext, nonce)
-                crc_good = False  # No authentication
-            except Exception as e3:
-                _LOGGER.warning(
-                    "Protocol 3.5 decrypt failed (all methods). cmd=%d, ciphertext_len=%d: %s",
-                    header.cmd, len(ciphertext), e3
-                )
-                # Return empty payload instead of encrypted garbage to avoid JSON parse errors
-                payload = b""
-                crc_good = False
-
-    # Extract retcode from payload if present (not for session key commands)
+            payload = cipher.decrypt_gcm_noauth(ciphertext, nonce)
+            crc_good = False  # No authentication
+        except Exception as e3:
+            _LOGGER.warning(
+                "Protocol 3.5 decrypt failed (all methods). cmd=%d, ciphertext_len=%d: %s",
+                header.cmd, len(ciphertext), e3
+            )
+            # Return empty payload instead of encrypted garbage to avoid JSON parse errors
+            payload = b""
+            crc_good = False
+
+    # Strip a leading zero retcode followed by data (not present for session
+    # key commands). Only a zero retcode is recognised, so nothing to unpack.
     retcode = 0
-    if len(payload) >= 4 and payload[:4] == b'\x00\x00\x00\x00':
-        # Check if this looks like a retcode followed by data
-        if len(payload) > 4:
-            retcode = struct.unpack(RETCODE_FMT, payload[:4])[0]
-            payload = payload[4:]
+    if len(payload) > RETCODE_SIZE and payload.startswith(_ZERO_RETCODE):
+        payload = payload[RETCODE_SIZE:]
 
+    # Positional, in field order: skips building a kwargs dict per frame
     return TuyaMessage(
-        seqno=header.seqno,
-        cmd=header.cmd,
-        payload=payload,
-        retcode=retcode,
-        crc_good=crc_good,
-        prefix=header.prefix,
-        nonce=nonce,
-        tag=tag
+        header.seqno, header.cmd, payload, retcode, crc_good, header.prefix, nonce, tag
     )
 
 
@@ -438,9 +496,21 @@ def _unpack_message_6699(
 
 def calculate_crc32(data: bytes) -> int:
     """Calculate CRC32 checksum."""
-    return binascii.crc32(data) & 0xFFFFFFFF
+    return zlib.crc32(data)
+
+
+@lru_cache(maxsize=64)
+def _hmac_template(key: bytes) -> "hmac.HMAC":
+    """Return an HMAC-SHA256 object keyed with key, for copying."""
+    return hmac.new(key, digestmod="sha256")
 
 
 def calculate_hmac_sha256(key: bytes, data: bytes) -> bytes:
-    """Calculate HMAC-SHA256."""
-    return hmac.new(key, data, sha256).digest()
+    """Calculate HMAC-SHA256.
+
+    The keyed inner/outer state is set up once per key and copied for each
+    call, instead of hashing the key again for every message.
+    """
+    mac = _hmac_template(key).copy()
+    mac.update(data)
+    return mac.digest()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+JSON serialization for Tuya payloads.
+
+The JSON backend is chosen here, once, for the whole integration:
+- Decoding uses orjson when installed (it ships with Home Assistant),
+  falling back to the standard library.
+- Encoding always uses the standard library, so the bytes sent to devices
+  (ASCII-only, \\uXXXX escapes) never depend on which libraries are present.
+"""
+
+import json
+from typing import Any
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+_JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize to compact, ASCII-only JSON bytes."""
+    return _JSON_ENCODER.encode(obj).encode("ascii")
+
+
+__all__ = ["json_dumps", "json_loads"]
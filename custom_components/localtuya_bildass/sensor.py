@@ -57,6 +57,7 @@ class LocaltuyaSensor(LocalTuyaEntity):
         # Parse enum options if configured (for device_class: enum)
         self._enum_options = []  # Raw values from device
         self._enum_options_friendly = []  # Friendly display names
+        self._enum_map = {}  # Raw value -> friendly name
 
         enum_options_str = self._config.get(CONF_ENUM_OPTIONS)
         if enum_options_str:
@@ -78,6 +79,10 @@ class LocaltuyaSensor(LocalTuyaEntity):
                     self._enum_options[len(self._enum_options_friendly)]
                 )
 
+            # First occurrence wins, as with a list lookup
+            for raw, friendly in zip(self._enum_options, self._enum_options_friendly):
+                self._enum_map.setdefault(raw, friendly)
+
             _LOGGER.debug(
                 "Sensor %s enum options: %s -> %s",
                 sensorid,
@@ -120,12 +125,11 @@ class LocaltuyaSensor(LocalTuyaEntity):
         # Handle enum device_class - translate raw value to friendly name
         if (
             self._config.get(CONF_DEVICE_CLASS) == SensorDeviceClass.ENUM
-            and self._enum_options
+            and self._enum_map
         ):
-            state_str = str(state)
-            if state_str in self._enum_options:
-                idx = self._enum_options.index(state_str)
-                state = self._enum_options_friendly[idx]
+            friendly = self._enum_map.get(str(state))
+            if friendly is not None:
+                state = friendly
             else:
                 _LOGGER.debug(
                     "Sensor %s received unknown enum value: %s (known: %s)",
@@ -10,15 +10,38 @@ Usage:
     python convert_tuya_local_template.py amico_smart_ceiling_fan.yaml
     python convert_tuya_local_template.py https://raw.githubusercontent.com/make-all/tuya-local/main/custom_components/tuya_local/devices/amico_smart_ceiling_fan.yaml
 
+Batch mode converts many templates in parallel and saves them straight to
+the devices folder (files, URLs, tuya-local filenames or glob patterns):
+    python convert_tuya_local_template.py --batch <source> [<source> ...]
+    python convert_tuya_local_template.py --batch "tuya-local/devices/*fan*.yaml"
+
 Source: https://github.com/make-all/tuya-local (MIT License)
 """
 
 import sys
+import os
+import glob
 import json
+import hashlib
+import http.client
 import yaml
-import urllib.request
+import urllib.parse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from tuya_local_cache import cache_file, json_safe, read_cache, write_cache
+
+# libyaml's C loader parses the (large) device YAML many times faster
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 
+TUYA_LOCAL_DEVICES_URL = "https://raw.githubusercontent.com/make-all/tuya-local/main/custom_components/tuya_local/devices/"
+DEVICES_DIR = Path(__file__).parent.parent / "custom_components" / "localtuya_bildass" / "devices"
 
 # Mapping from tuya-local entity types to our platform names
 ENTITY_TO_PLATFORM = {
@@ -61,16 +84,116 @@ DPS_NAME_MAPPING = {
     "current_humidity": "current_humidity_dp",
 }
 
+# Entity types that decide a template's category, highest priority first.
+# Templates with none of them are categorised as "switch".
+CATEGORY_PRIORITY = (
+    "climate",
+    "vacuum",
+    "cover",
+    "fan",
+    "light",
+    "humidifier",
+    "water_heater",
+)
+
+# DPS whose value mappings become a list of modes (e.g. "preset_modes")
+MODE_LIST_DPS = frozenset({"preset_mode", "hvac_mode", "fan_mode"})
+
+
+# Keep-alive connections, one per (scheme, host), reused across fetches
+_connections: Dict[Tuple[str, str], http.client.HTTPConnection] = {}
+
+
+# Redirect statuses followed by _http_get (as urllib did)
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+MAX_REDIRECTS = 5
+
+
+def _http_get_once(url: str, headers: dict) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    """GET a URL over a reused keep-alive connection, without following redirects."""
+    parts = urllib.parse.urlsplit(url)
+    path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+    key = (parts.scheme, parts.netloc)
+
+    for attempt in range(2):
+        conn = _connections.get(key)
+        if conn is None:
+            if parts.scheme == "https":
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=30)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=30)
+            _connections[key] = conn
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.headers, response.read()
+        except (http.client.HTTPException, OSError):
+            # The server may have closed the idle connection; reconnect once
+            conn.close()
+            del _connections[key]
+            if attempt:
+                raise
+
+
+def _http_get(url: str, headers: dict) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    """GET a URL over reused keep-alive connections, following redirects.
+
+    Returns (status, headers, body) of the final response.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        status, response_headers, body = _http_get_once(url, headers)
+        location = response_headers.get("Location")
+        if status not in REDIRECT_STATUSES or not location:
+            return status, response_headers, body
+        url = urllib.parse.urljoin(url, location)
+    raise OSError(f"Too many redirects fetching {url}")
+
+
+def _cache_name(source: str) -> str:
+    """Return the cache entry name for a YAML file or URL."""
+    if not source.startswith("http"):
+        source = str(Path(source).resolve())
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+    return f"template_{digest}.json"
+
 
 def fetch_yaml(source: str) -> dict:
-    """Fetch YAML from file or URL."""
+    """Fetch YAML from file or URL.
+
+    Parsed templates are cached as JSON (see tuya_local_cache) and reused
+    while the source is unchanged: by mtime for files, and by the server's
+    ETag / Last-Modified (conditional GET) for URLs. Templates that would
+    not survive a JSON round trip (e.g. int mapping keys) are not cached.
+    """
+    cache_name = _cache_name(source)
+    cached = read_cache(cache_name)
+    etag = last_modified = None
+
     if source.startswith("http"):
-        with urllib.request.urlopen(source) as response:
-            content = response.read().decode("utf-8")
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        status, response_headers, body = _http_get(source, headers)
+        if status == 304 and cached:
+            return cached["data"]
+        if status != 200:
+            raise OSError(f"HTTP {status} fetching {source}")
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        # PyYAML decodes bytes itself; no intermediate str copy
+        data = yaml.load(body, Loader=YamlLoader)
     else:
-        with open(source, "r") as f:
-            content = f.read()
-    return yaml.safe_load(content)
+        if cached and cache_file(cache_name).stat().st_mtime >= Path(source).stat().st_mtime:
+            return cached["data"]
+        with open(source, "rb") as f:
+            data = yaml.load(f, Loader=YamlLoader)
+
+    if json_safe(data):
+        write_cache(cache_name, {"etag": etag, "last_modified": last_modified, "data": data})
+    return data
 
 
 def convert_dps_mapping(dps_list: list, entity_type: str) -> dict:
@@ -87,11 +210,10 @@ def convert_dps_mapping(dps_list: list, entity_type: str) -> dict:
             config["id"] = dps_id
             continue
 
-        # Map known DPS names to our config keys
-        if dps_name in DPS_NAME_MAPPING:
-            key = DPS_NAME_MAPPING[dps_name]
-            if key != "id":  # Already handled above
-                config[key] = dps_id
+        # Map known DPS names to our config keys ("id" is handled above)
+        key = DPS_NAME_MAPPING.get(dps_name)
+        if key is not None:
+            config[key] = dps_id
 
         # Handle ranges (for number entities, brightness, etc.)
         if "range" in dps:
@@ -101,14 +223,13 @@ def convert_dps_mapping(dps_list: list, entity_type: str) -> dict:
             if "max" in range_info:
                 config["max_value"] = range_info["max"]
 
-        # Handle value mappings
-        if "mapping" in dps:
-            mappings = dps["mapping"]
-            values = []
-            for m in mappings:
-                if "dps_val" in m and "value" in m:
-                    values.append(str(m["dps_val"]))
-            if values and dps_name in ["preset_mode", "hvac_mode", "fan_mode"]:
+        # Handle value mappings (only mode DPS use them)
+        if dps_name in MODE_LIST_DPS and "mapping" in dps:
+            values = [
+                str(m["dps_val"]) for m in dps["mapping"]
+                if "dps_val" in m and "value" in m
+            ]
+            if values:
                 config[f"{dps_name}s"] = values
 
     # If no main ID found, use first DPS
@@ -118,12 +239,19 @@ def convert_dps_mapping(dps_list: list, entity_type: str) -> dict:
     return config
 
 
+@lru_cache(maxsize=1024)
+def humanize(name: str) -> str:
+    """Convert snake_case to Title Case (translation keys repeat a lot)."""
+    return name.replace("_", " ").title()
+
+
 def convert_entity(entity: dict) -> dict:
     """Convert a single tuya-local entity to our format."""
-    entity_type = entity.get("entity", "switch")
+    get = entity.get
+    entity_type = get("entity", "switch")
     platform = ENTITY_TO_PLATFORM.get(entity_type, entity_type)
 
-    dps_list = entity.get("dps", [])
+    dps_list = get("dps", [])
 
     # Start with basic config
     our_entity = {
@@ -135,24 +263,17 @@ def convert_entity(entity: dict) -> dict:
     our_entity.update(dps_config)
 
     # Add friendly name from translation key or entity type
-    translation_key = entity.get("translation_key") or entity.get("translation_only_key")
-    if translation_key:
-        # Convert snake_case to Title Case
-        friendly_name = translation_key.replace("_", " ").title()
-    else:
-        friendly_name = entity_type.replace("_", " ").title()
-    our_entity["friendly_name"] = friendly_name
+    translation_key = get("translation_key") or get("translation_only_key")
+    our_entity["friendly_name"] = humanize(translation_key or entity_type)
 
     # Handle device class if present
     if "class" in entity:
         our_entity["device_class"] = entity["class"]
 
     # Handle category (diagnostic, config, etc.)
-    category = entity.get("category")
-    if category == "diagnostic":
-        our_entity["entity_category"] = "diagnostic"
-    elif category == "config":
-        our_entity["entity_category"] = "config"
+    category = get("category")
+    if category in ("diagnostic", "config"):
+        our_entity["entity_category"] = category
 
     return our_entity
 
@@ -199,27 +320,93 @@ def convert_template(tuya_local: dict, source_file: str = "") -> dict:
 
 def guess_category(tuya_local: dict) -> str:
     """Guess device category from entities."""
-    entities = tuya_local.get("entities", [])
-    entity_types = [e.get("entity", "") for e in entities]
-
-    if "climate" in entity_types:
-        return "climate"
-    elif "vacuum" in entity_types:
-        return "vacuum"
-    elif "cover" in entity_types:
-        return "cover"
-    elif "fan" in entity_types:
-        if "light" in entity_types:
-            return "fan_light"
-        return "fan"
-    elif "light" in entity_types:
-        return "light"
-    elif "humidifier" in entity_types:
-        return "humidifier"
-    elif "water_heater" in entity_types:
-        return "water_heater"
-    else:
-        return "switch"
+    entity_types = {e.get("entity", "") for e in tuya_local.get("entities", [])}
+
+    for entity_type in CATEGORY_PRIORITY:
+        if entity_type in entity_types:
+            if entity_type == "fan" and "light" in entity_types:
+                return "fan_light"
+            return entity_type
+    return "switch"
+
+
+def dumps_template(template: dict) -> str:
+    """Serialize a template as indented JSON.
+
+    Always the stdlib encoder, so saved device files do not depend on which
+    JSON libraries are installed.
+    """
+    return json.dumps(template, indent=2, ensure_ascii=False)
+
+
+def resolve_source(source: str) -> str:
+    """Turn a bare tuya-local filename into its raw GitHub URL."""
+    if not source.startswith("http") and not Path(source).exists():
+        return TUYA_LOCAL_DEVICES_URL + source
+    return source
+
+
+def source_filename(source: str) -> str:
+    """Return the template filename of a path or URL."""
+    return source.split("/")[-1] if "/" in source else source
+
+
+def convert_one(source: str) -> Tuple[str, Optional[Path], Optional[str]]:
+    """Convert one template and save it to the devices folder.
+
+    Runs in a batch worker process, so errors are returned rather than
+    raised: (source, output_path, error).
+    """
+    try:
+        source_file = source_filename(source)
+        our_template = convert_template(fetch_yaml(source), source_file)
+        output_path = DEVICES_DIR / source_file.replace(".yaml", ".json")
+        with open(output_path, "w") as f:
+            f.write(dumps_template(our_template))
+        return source, output_path, None
+    except Exception as e:
+        return source, None, str(e)
+
+
+def convert_batch(patterns: List[str]) -> int:
+    """Convert many templates in parallel; returns the number of failures."""
+    if not patterns:
+        print("No templates given.")
+        return 1
+
+    # A pattern that matches nothing counts as a failure, so scripted
+    # bulk runs don't pass silently
+    failures = 0
+    sources = []
+    for pattern in patterns:
+        if not pattern.startswith("http") and any(c in pattern for c in "*?["):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                failures += 1
+                print(f"FAILED {pattern}: no templates matched")
+            sources.extend(matches)
+        else:
+            sources.append(resolve_source(pattern))
+    if not sources:
+        return failures
+
+    # YAML parsing is CPU-bound and holds the GIL, so use processes;
+    # each worker keeps its own keep-alive connections
+    converted = 0
+    workers = min(len(sources), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source, output_path, error in executor.map(convert_one, sources):
+            if error:
+                failures += 1
+                print(f"FAILED {source}: {error}")
+            else:
+                converted += 1
+                print(f"Saved {output_path}")
+
+    print(f"\nConverted {converted}/{len(sources)} templates.")
+    if failures == 0:
+        print("Review the generated templates before use; protocol_version defaults to 3.3.")
+    return failures
 
 
 def main():
@@ -228,11 +415,11 @@ def main():
         print("\nAvailable templates: https://github.com/make-all/tuya-local/tree/main/custom_components/tuya_local/devices")
         sys.exit(1)
 
-    source = sys.argv[1]
+    if sys.argv[1] == "--batch":
+        sys.exit(1 if convert_batch(sys.argv[2:]) else 0)
 
-    # If just filename, construct full URL
-    if not source.startswith("http") and not Path(source).exists():
-        source = f"https://raw.githubusercontent.com/make-all/tuya-local/main/custom_components/tuya_local/devices/{source}"
+    source = resolve_source(sys.argv[1])
+    if source != sys.argv[1]:
         print(f"Fetching: {source}")
 
     try:
@@ -242,26 +429,27 @@ def main():
         sys.exit(1)
 
     # Extract filename for reference
-    source_file = source.split("/")[-1] if "/" in source else source
+    source_file = source_filename(source)
 
     # Convert
     our_template = convert_template(tuya_local, source_file)
 
     # Output
     output_filename = source_file.replace(".yaml", ".json")
-    output_path = Path(__file__).parent.parent / "custom_components" / "localtuya_bildass" / "devices" / output_filename
+    output_path = DEVICES_DIR / output_filename
 
     print("\n" + "=" * 60)
     print("CONVERTED TEMPLATE")
     print("=" * 60)
-    print(json.dumps(our_template, indent=2, ensure_ascii=False))
+    template_json = dumps_template(our_template)
+    print(template_json)
     print("=" * 60)
 
     # Ask to save
     print(f"\nOutput path: {output_path}")
     if input("\nSave to devices folder? [y/N]: ").lower() == "y":
         with open(output_path, "w") as f:
-            json.dump(our_template, f, indent=2, ensure_ascii=False)
+            f.write(template_json)
         print(f"Saved to: {output_path}")
         print("\nRemember to:")
         print("1. Review and adjust the template")
@@ -17,32 +17,77 @@ import sys
 import json
 import urllib.request
 
+from tuya_local_cache import read_cache, write_cache
 
-DEVICES_API = "https://api.github.com/repos/make-all/tuya-local/contents/custom_components/tuya_local/devices"
 
+REPO_API = "https://api.github.com/repos/make-all/tuya-local"
+DEVICES_PATH = "custom_components/tuya_local/devices/"
+CACHE_NAME = "devices.json"
 
-def fetch_device_list() -> list:
-    """Fetch list of all device template files."""
-    req = urllib.request.Request(
-        DEVICES_API,
-        headers={"Accept": "application/vnd.github.v3+json"}
-    )
+
+def _github_get(url: str, accept: str = "application/vnd.github.v3+json") -> bytes:
+    """GET a GitHub API URL and return the raw response body."""
+    req = urllib.request.Request(url, headers={"Accept": accept})
     with urllib.request.urlopen(req) as response:
-        data = json.loads(response.read().decode("utf-8"))
+        return response.read()
+
 
-    # Filter only YAML files
-    return [f["name"] for f in data if f["name"].endswith(".yaml")]
+def fetch_device_list() -> list:
+    """Fetch list of all device template files as (name, lowercased name) pairs.
+
+    The listing comes from a single Git Trees API call and is cached in
+    ~/.cache/localtuya, keyed by the commit SHA of tuya-local's main branch.
+    Each run only asks GitHub for that SHA and refetches the tree when it moved.
+    """
+    cached = read_cache(CACHE_NAME)
+    if cached and "entries" not in cached:
+        cached = None  # Written by an older version of this script
+    try:
+        sha = _github_get(f"{REPO_API}/commits/main", "application/vnd.github.sha").decode("ascii").strip()
+    except OSError:
+        if cached:
+            return cached["entries"]  # Offline or rate limited: use what we have
+        raise
+
+    if cached and cached.get("sha") == sha:
+        return cached["entries"]
+
+    # json.loads decodes UTF-8 bytes itself; no intermediate str copy
+    data = json.loads(_github_get(f"{REPO_API}/git/trees/{sha}?recursive=1"))
+
+    # Filter only YAML files directly in the devices folder
+    prefix_len = len(DEVICES_PATH)
+    names = [
+        entry["path"][prefix_len:]
+        for entry in data["tree"]
+        if entry["type"] == "blob"
+        and entry["path"].startswith(DEVICES_PATH)
+        and entry["path"].endswith(".yaml")
+        and "/" not in entry["path"][prefix_len:]
+    ]
+    # Lowercased once here (and cached) rather than on every search
+    devices = [(name, name.lower()) for name in names]
+    write_cache(CACHE_NAME, {"sha": sha, "entries": devices})
+    return devices
 
 
 def search_templates(keywords: list, devices: list) -> list:
-    """Search device names for keywords."""
-    keywords_lower = [k.lower() for k in keywords]
+    """Search device names for keywords.
+
+    Args:
+        keywords: Keywords that must all appear in the name (any case)
+        devices: (name, lowercased name) pairs from fetch_device_list()
+    """
+    # Longest keywords first: they are the most selective, so misses bail early
+    keywords_lower = sorted((k.lower() for k in keywords), key=len, reverse=True)
     matches = []
 
-    for device in devices:
-        device_lower = device.lower()
+    for device, device_lower in devices:
         # Check if ALL keywords match
-        if all(kw in device_lower for kw in keywords_lower):
+        for kw in keywords_lower:
+            if kw not in device_lower:
+                break
+        else:
             matches.append(device)
 
     return sorted(matches)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Shared on-disk cache for the tuya-local tools.
+
+Both search_tuya_local.py and convert_tuya_local_template.py keep their
+cached data as JSON files under ~/.cache/localtuya. Caching is best-effort:
+unreadable entries count as misses and write failures are ignored.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+
+CACHE_DIR = Path.home() / ".cache" / "localtuya"
+
+
+def cache_file(name: str) -> Path:
+    """Return the path of a cache entry."""
+    return CACHE_DIR / name
+
+
+def read_cache(name: str) -> Optional[dict]:
+    """Load a cache entry, or None if there is no usable one."""
+    try:
+        with open(cache_file(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(name: str, entry: dict) -> None:
+    """Store a cache entry. Failures are ignored."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(cache_file(name), "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def json_safe(obj: Any) -> bool:
+    """Return whether obj survives a JSON round trip unchanged.
+
+    YAML allows int/bool mapping keys and types such as dates, which JSON
+    would turn into strings (or reject), so such data must not be cached.
+    """
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return True
+    if isinstance(obj, list):
+        return all(json_safe(item) for item in obj)
+    if isinstance(obj, dict):
+        return all(isinstance(k, str) and json_safe(v) for k, v in obj.items())
+    return False